@@ -33,6 +33,7 @@ hidden_imports = [
     'jose',
     'openai',
     'httpx',
+    'h2',
     'socksio',
     'aiofiles',
     'sse_starlette',
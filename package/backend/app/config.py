@@ -1,7 +1,9 @@
+from dotenv import dotenv_values, load_dotenv
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 import os
 import sys
+import threading
 
 
 def get_exe_dir():
@@ -16,20 +18,28 @@ def get_exe_dir():
 
 def get_env_file_path():
     """获取 .env 文件路径"""
-    return os.path.join(get_exe_dir(), '.env')
+    return _ENV_FILE
 
 
 def get_default_database_url():
     """获取默认数据库 URL，指向 exe 同目录"""
-    exe_dir = get_exe_dir()
-    db_path = os.path.join(exe_dir, 'ai_polish.db')
-    return f"sqlite:///{db_path}"
+    return _DEFAULT_DB_URL
+
+
+# 进程运行期间这些路径不会变化，导入时计算一次
+_EXE_DIR = get_exe_dir()
+_ENV_FILE = os.path.join(_EXE_DIR, '.env')
+_DEFAULT_DB_URL = f"sqlite:///{os.path.join(_EXE_DIR, 'ai_polish.db')}"
 
 
 class Settings(BaseSettings):
     # 服务器配置
     SERVER_HOST: str = "0.0.0.0"
     SERVER_PORT: int = 9800
+    # 是否输出每个请求的访问日志（关闭可减少每请求的日志开销）
+    ACCESS_LOG: bool = False
+    # 允许跨域访问的来源，逗号分隔；"*" 表示允许任意来源
+    ALLOWED_ORIGINS: str = "http://localhost:5174,http://127.0.0.1:5174"
 
     # 数据库配置 - 默认使用 exe 同目录
     DATABASE_URL: str = get_default_database_url()
@@ -53,8 +63,11 @@ class Settings(BaseSettings):
     
     # 并发配置
     MAX_CONCURRENT_USERS: int = 5
+    SEGMENT_CONCURRENCY: int = 1  # 单个会话内同时请求的段落数，1 表示逐段顺序处理
     DEFAULT_USAGE_LIMIT: int = 1
     SEGMENT_SKIP_THRESHOLD: int = 15
+    DB_COMMIT_BATCH_SIZE: int = 10  # 段落处理结果每累计多少条提交一次数据库
+    RESPONSE_CACHE_ENABLED: bool = False  # 相同阶段、模型、提示词和输入时复用已缓存的 AI 结果
 
     # Word Formatter 文件上传限制 (MB)，0 表示无限制
     MAX_UPLOAD_FILE_SIZE_MB: int = 0
@@ -73,6 +86,10 @@ class Settings(BaseSettings):
     # 流式输出配置
     USE_STREAMING: bool = False  # 默认使用非流式模式，避免被API阻止
 
+    # 请求体压缩配置 (需要 API 服务端支持 Content-Encoding: gzip)
+    REQUEST_GZIP_ENABLED: bool = False  # 默认关闭，部分 OpenAI 兼容代理不支持压缩请求体
+    REQUEST_GZIP_MIN_BYTES: int = 1024  # 请求体超过该字节数才压缩
+
     # 思考模式配置
     THINKING_MODE_ENABLED: bool = True  # 默认启用思考模式
     THINKING_MODE_EFFORT: str = "high"  # 思考强度: none, low, medium, high, xhigh
@@ -86,49 +103,57 @@ class Settings(BaseSettings):
     ADMIN_USERNAME: str = "admin"
     ADMIN_PASSWORD: str = "admin123"
     
+    @property
+    def allowed_origins(self) -> List[str]:
+        """解析后的跨域来源列表"""
+        return [o.strip() for o in self.ALLOWED_ORIGINS.split(",") if o.strip()]
+    
     class Config:
-        env_file = get_env_file_path()
+        # 不设置 env_file：.env 已由下方 load_dotenv 写入环境变量，避免重复解析
         case_sensitive = True
 
 
 # 加载 exe 目录下的 .env 文件
-_env_path = get_env_file_path()
-if os.path.exists(_env_path):
-    from dotenv import load_dotenv
-    load_dotenv(_env_path)
+if os.path.exists(_ENV_FILE):
+    load_dotenv(_ENV_FILE)
 
 settings = Settings()
 
+# 避免并发的重新加载交错写入 settings
+_env_reload_lock = threading.Lock()
+
 
 def reload_settings():
     """重新加载配置 - 直接更新现有 settings 对象的属性"""
-    global settings
-    
-    # 重新读取 .env 文件到环境变量 - 使用 exe 目录
-    env_path = get_env_file_path()
-    if os.path.exists(env_path):
-        with open(env_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    os.environ[key] = value
-                    
-                    # 直接更新 settings 对象的属性
-                    if hasattr(settings, key):
-                        # 获取字段类型并转换
-                        field_type = type(getattr(settings, key))
-                        try:
-                            if field_type == int:
-                                setattr(settings, key, int(value))
-                            elif field_type == bool:
-                                setattr(settings, key, value.lower() in ('true', '1', 'yes'))
-                            else:
-                                setattr(settings, key, value)
-                        except (ValueError, TypeError):
-                            setattr(settings, key, value)
+    with _env_reload_lock:
+        if os.path.exists(_ENV_FILE):
+            _load_env_file(_ENV_FILE)
     
     return settings
 
+
+def _to_bool(value: str) -> bool:
+    return value.lower() in ('true', '1', 'yes')
+
+
+# 按字段类型转换 .env 中的字符串值，其他类型保持字符串
+_CONVERTERS = {int: int, bool: _to_bool}
+
+# 字段名 -> 字段类型，只在导入时构建一次
+_FIELD_TYPES = {name: field.annotation for name, field in Settings.model_fields.items()}
+
+
+def _load_env_file(env_path: str):
+    """重新读取 .env 文件到环境变量和 settings 对象"""
+    for key, value in dotenv_values(env_path).items():
+        if value is None:
+            continue
+        os.environ[key] = value
+        
+        # 直接更新 settings 对象的属性
+        if key in _FIELD_TYPES:
+            converter = _CONVERTERS.get(_FIELD_TYPES[key])
+            try:
+                setattr(settings, key, converter(value) if converter else value)
+            except (ValueError, TypeError):
+                setattr(settings, key, value)
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -8,10 +9,33 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
 )
 
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """为每个新建的 SQLite 连接设置 PRAGMA
+
+        WAL 模式下读不阻塞写；synchronous/cache_size/temp_store 只对当前连接生效，因此需在建连时设置。
+        """
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA cache_size=-20000")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# 支持 INSERT ... ON CONFLICT 的数据库方言
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
 
 def get_db():
     """数据库会话依赖"""
@@ -37,6 +61,10 @@ def init_db():
         # 自动添加性能优化索引
         _add_performance_indexes()
         
+        # 迁移期间打开的连接缓存了旧的表结构（SQLite 解析 ON CONFLICT 时不会重新加载），
+        # 丢弃连接池中的连接，后续请求使用新连接
+        engine.dispose()
+        
         print("✓ 数据库初始化成功")
         return True
     except Exception as e:
@@ -44,6 +72,58 @@ def init_db():
         raise
 
 
+def warm_pool():
+    """预先建立连接池中的连接，避免首个请求承担建连和 PRAGMA 的开销"""
+    # QueuePool 有固定大小；NullPool/StaticPool 等没有 size()，只预热一个连接
+    size_fn = getattr(engine.pool, "size", None)
+    pool_size = size_fn() if callable(size_fn) else 1
+    connections = [engine.connect() for _ in range(pool_size)]
+    try:
+        for conn in connections:
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def seed_default_prompts():
+    """创建缺失的系统默认提示词"""
+    from app.models.models import CustomPrompt
+    from app.services.ai_service import get_default_enhance_prompt, get_default_polish_prompt
+
+    db = SessionLocal()
+    try:
+        defaults = [
+            {"name": "默认润色提示词", "stage": "polish", "content": get_default_polish_prompt()},
+            {"name": "默认增强提示词", "stage": "enhance", "content": get_default_enhance_prompt()},
+        ]
+        dialect_insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            # 一条 INSERT ... ON CONFLICT DO NOTHING 批量写入，已存在的系统提示词由部分唯一索引跳过
+            db.execute(
+                dialect_insert(CustomPrompt).values([
+                    dict(item, is_default=True, is_system=True) for item in defaults
+                ]).on_conflict_do_nothing(
+                    index_elements=["stage"],
+                    index_where=CustomPrompt.is_system.is_(True)
+                )
+            )
+        else:
+            # 不支持 ON CONFLICT 的数据库：一次查询检查已存在的系统提示词阶段
+            existing_stages = {
+                stage for (stage,) in db.query(CustomPrompt.stage).filter(
+                    CustomPrompt.is_system.is_(True),
+                    CustomPrompt.stage.in_([item["stage"] for item in defaults])
+                ).all()
+            }
+            for item in defaults:
+                if item["stage"] not in existing_stages:
+                    db.add(CustomPrompt(**item, is_default=True, is_system=True))
+        db.commit()
+    finally:
+        db.close()
+
+
 def _add_column_safely(conn, table_name, column_name, column_def):
     """安全地添加列（如果不存在）"""
     try:
@@ -107,6 +187,46 @@ def _add_performance_indexes():
                     conn.rollback()
                     # 静默失败，不阻止应用启动
                     pass
+            
+            # session_history 的唯一索引（UPSERT 依赖），创建前清理旧版本可能遗留的重复记录
+            if "session_history" in tables:
+                index_names = {idx['name'] for idx in inspector.get_indexes("session_history")}
+                if "uq_session_history_stage" not in index_names:
+                    try:
+                        conn.execute(text(
+                            "DELETE FROM session_history WHERE id NOT IN ("
+                            "SELECT MAX(id) FROM session_history "
+                            "GROUP BY session_id, stage, is_compressed)"
+                        ))
+                        conn.execute(text(
+                            "CREATE UNIQUE INDEX IF NOT EXISTS uq_session_history_stage "
+                            "ON session_history (session_id, stage, is_compressed)"
+                        ))
+                        conn.commit()
+                        print("  ✓ 添加索引: uq_session_history_stage")
+                    except Exception:
+                        conn.rollback()
+            
+            # 系统提示词的部分唯一索引（启动时 UPSERT 依赖），创建前清理重复的系统提示词
+            if "custom_prompts" in tables:
+                index_names = {idx['name'] for idx in inspector.get_indexes("custom_prompts")}
+                if "ux_custom_prompt_system_stage" not in index_names:
+                    from app.models.models import CustomPrompt
+                    try:
+                        conn.execute(text(
+                            "DELETE FROM custom_prompts WHERE is_system = :flag AND id NOT IN ("
+                            "SELECT MIN(id) FROM custom_prompts WHERE is_system = :flag GROUP BY stage)"
+                        ), {"flag": True})
+                        # 直接使用模型上声明的索引，保证 WHERE 条件与 ON CONFLICT 子句一致
+                        system_stage_index = next(
+                            idx for idx in CustomPrompt.__table__.indexes
+                            if idx.name == "ux_custom_prompt_system_stage"
+                        )
+                        system_stage_index.create(conn, checkfirst=True)
+                        conn.commit()
+                        print("  ✓ 添加索引: ux_custom_prompt_system_stage")
+                    except Exception:
+                        conn.rollback()
     
     except Exception as e:
         print(f"  ⚠ 添加性能索引警告: {str(e)}")
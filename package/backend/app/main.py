@@ -1,22 +1,21 @@
-from fastapi import FastAPI, Request, HTTPException, Response
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
-import os
-import sys
-from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Dict, Tuple, Optional
+import asyncio
+import json
+import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional
 
 # 先导入 config 以便加载环境变量
 from app.config import settings
-from app.database import init_db
+from app.utils.compression import SelectiveGZipMiddleware
+from app.database import init_db, seed_default_prompts, warm_pool
 from app.routes import admin, prompts, optimization
 from app.word_formatter import router as word_formatter_router
 from app.word_formatter.services import get_job_manager
-from app.models.models import CustomPrompt
-from app.database import SessionLocal
-from app.services.ai_service import get_default_polish_prompt, get_default_enhance_prompt
+from app.services.ai_service import close_shared_http_client
 
 
 # 响应缓存头中间件 - 优化浏览器缓存
@@ -68,14 +67,33 @@ if settings.ADMIN_PASSWORD == "admin123":
     print("="*60 + "\n")
     # 仅警告,不强制退出 (开发环境可能需要)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时初始化，关闭时清理资源"""
+    # 初始化数据库并创建系统默认提示词；同步的 SQLAlchemy 操作放到线程中执行，不阻塞事件循环
+    await asyncio.to_thread(init_db)
+    # 预热连接池，首个请求无需再建立数据库连接
+    await asyncio.to_thread(warm_pool)
+    await asyncio.to_thread(seed_default_prompts)
+
+    yield
+
+    job_manager = get_job_manager()
+    await job_manager.shutdown()
+    # 关闭共享的 AI 请求连接池
+    await close_shared_http_client()
+
+
 app = FastAPI(
     title="AI 论文润色增强系统",
     description="高质量论文润色与原创性学术表达增强",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 添加 Gzip 压缩中间件以减少响应体积
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1500, compresslevel=6)
 
 # 添加缓存控制中间件
 app.add_middleware(CacheControlMiddleware)
@@ -83,10 +101,11 @@ app.add_middleware(CacheControlMiddleware)
 # CORS 配置
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # 生产环境应设置具体域名
+    allow_origins=settings.allowed_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # 显式列出前端实际使用的方法和请求头，避免通配符匹配
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
 )
 
 # 注册路由（添加 /api 前缀，与 backend/app/main.py 保持一致）
@@ -98,58 +117,6 @@ app.include_router(word_formatter_router, prefix="/api")
 # 速率限制中间件已移除
 
 
-@app.on_event("startup")
-async def startup_event():
-    """启动时初始化"""
-    # 初始化数据库
-    init_db()
-
-    # 创建系统默认提示词
-    db = SessionLocal()
-    try:
-        # 检查是否已存在系统提示词
-        polish_prompt = db.query(CustomPrompt).filter(
-            CustomPrompt.is_system.is_(True),
-            CustomPrompt.stage == "polish"
-        ).first()
-
-        if not polish_prompt:
-            polish_prompt = CustomPrompt(
-                name="默认润色提示词",
-                stage="polish",
-                content=get_default_polish_prompt(),
-                is_default=True,
-                is_system=True
-            )
-            db.add(polish_prompt)
-
-        enhance_prompt = db.query(CustomPrompt).filter(
-            CustomPrompt.is_system.is_(True),
-            CustomPrompt.stage == "enhance"
-        ).first()
-
-        if not enhance_prompt:
-            enhance_prompt = CustomPrompt(
-                name="默认增强提示词",
-                stage="enhance",
-                content=get_default_enhance_prompt(),
-                is_default=True,
-                is_system=True
-            )
-            db.add(enhance_prompt)
-
-        db.commit()
-    finally:
-        db.close()
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """关闭时清理资源"""
-    job_manager = get_job_manager()
-    await job_manager.shutdown()
-
-
 @app.get("/")
 async def root():
     """根路径"""
@@ -166,31 +133,27 @@ async def health_check():
     return {"status": "healthy"}
 
 
+# 验证 base_url 是否符合 OpenAI API 格式（使用更严格的 URL 验证模式）
+_URL_RE = re.compile(r'^https?://[^\s/$.?#].[^\s]*$', re.IGNORECASE)
+
+
+@lru_cache(maxsize=32)
 def _check_url_format(base_url: Optional[str]) -> tuple:
-    """检查 URL 格式是否正确
+    """检查 URL 格式是否正确（纯函数，按 URL 缓存结果）
     
     Returns:
         tuple: (is_valid, error_message)
     """
-    import re
-    
     if not base_url or not base_url.strip():
         return False, "Base URL 未配置"
     
-    # 验证 base_url 是否符合 OpenAI API 格式
-    # 使用更严格的 URL 验证模式
-    url_pattern = re.compile(r'^https?://[^\s/$.?#].[^\s]*$', re.IGNORECASE)
-    if not url_pattern.match(base_url):
+    if not _URL_RE.match(base_url):
         return False, "Base URL 格式不正确，应为有效的 HTTP/HTTPS URL"
     
     return True, None
 
 
-# 缓存已检查的 URL 结果，避免重复检查
-_url_check_cache: dict = {}
-
-
-async def _check_model_health(model_name: str, model: str, api_key: Optional[str], base_url: Optional[str]) -> dict:
+def _check_model_health(model_name: str, model: str, api_key: Optional[str], base_url: Optional[str]) -> dict:
     """检查单个模型的健康状态 - 只验证URL格式，不测试实际连接"""
     
     try:
@@ -214,27 +177,12 @@ async def _check_model_health(model_name: str, model: str, api_key: Optional[str
                 "error": error_msg
             }
         
-        # URL 有效时才检查缓存（此时 base_url 不为 None）
-        if base_url in _url_check_cache:
-            cached_result = _url_check_cache[base_url]
-            result = {
-                "status": cached_result["status"],
-                "model": model,
-                "base_url": base_url
-            }
-            if cached_result["status"] == "unavailable":
-                result["error"] = cached_result.get("error")
-            return result
-        
         # URL 格式正确，认为配置有效
-        result = {
+        return {
             "status": "available",
             "model": model,
             "base_url": base_url
         }
-        # 缓存检查结果
-        _url_check_cache[base_url] = {"status": "available"}
-        return result
         
     except Exception as e:
         error_msg = str(e) if str(e) else "未知错误"
@@ -246,52 +194,39 @@ async def _check_model_health(model_name: str, model: str, api_key: Optional[str
         }
 
 
-@app.get("/api/health/models")
-async def check_models_health():
-    """检查 AI 模型可用性 - 只验证URL格式，如果URL相同则只检查一次"""
-    global _url_check_cache
-    # 清空缓存以确保每次请求都重新检查
-    _url_check_cache = {}
-    
+@lru_cache(maxsize=8)
+def _models_health_body(checks: tuple) -> bytes:
+    """根据模型配置生成健康检查的 JSON 响应体（纯函数，配置不变时直接复用）"""
     results = {
         "overall_status": "healthy",
-        "models": {}
+        "models": {
+            name: _check_model_health(name, model, api_key, base_url)
+            for name, model, api_key, base_url in checks
+        }
     }
     
-    # 检查润色模型
-    results["models"]["polish"] = await _check_model_health(
-        "polish",
-        settings.POLISH_MODEL,
-        settings.POLISH_API_KEY,
-        settings.POLISH_BASE_URL
-    )
-    if results["models"]["polish"]["status"] == "unavailable":
+    if any(r["status"] == "unavailable" for r in results["models"].values()):
         results["overall_status"] = "degraded"
     
-    # 检查增强模型
-    results["models"]["enhance"] = await _check_model_health(
-        "enhance",
-        settings.ENHANCE_MODEL,
-        settings.ENHANCE_API_KEY,
-        settings.ENHANCE_BASE_URL
+    # 与 JSONResponse 的序列化方式一致
+    return json.dumps(results, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+@app.get("/api/health/models")
+async def check_models_health():
+    """检查 AI 模型可用性 - 只验证URL格式，配置未变化时直接返回缓存的结果"""
+    # 润色模型、增强模型，以及感情润色模型（如果配置了）
+    # 配置可由管理后台热更新，因此以当前配置作为缓存键，而不是在启动时固定结果
+    checks = (
+        ("polish", settings.POLISH_MODEL, settings.POLISH_API_KEY, settings.POLISH_BASE_URL),
+        ("enhance", settings.ENHANCE_MODEL, settings.ENHANCE_API_KEY, settings.ENHANCE_BASE_URL),
     )
-    if results["models"]["enhance"]["status"] == "unavailable":
-        results["overall_status"] = "degraded"
-    
-    # 检查感情润色模型（如果配置了）
     if settings.EMOTION_MODEL:
-        results["models"]["emotion"] = await _check_model_health(
-            "emotion",
-            settings.EMOTION_MODEL,
-            settings.EMOTION_API_KEY,
-            settings.EMOTION_BASE_URL
-        )
-        if results["models"]["emotion"]["status"] == "unavailable":
-            results["overall_status"] = "degraded"
+        checks += (("emotion", settings.EMOTION_MODEL, settings.EMOTION_API_KEY, settings.EMOTION_BASE_URL),)
     
-    return results
+    return Response(content=_models_health_body(checks), media_type="application/json")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host=settings.SERVER_HOST, port=settings.SERVER_PORT)
+    uvicorn.run(app, host=settings.SERVER_HOST, port=settings.SERVER_PORT, access_log=settings.ACCESS_LOG)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -41,6 +41,15 @@ class CustomPrompt(Base):
     
     # 关系
     user = relationship("User", back_populates="prompts")
+    
+    __table_args__ = (
+        # 每个阶段只允许一条系统提示词，启动时的 INSERT ... ON CONFLICT 依赖该部分唯一索引
+        Index(
+            "ux_custom_prompt_system_stage", "stage", unique=True,
+            sqlite_where=is_system.is_(True),
+            postgresql_where=is_system.is_(True),
+        ),
+    )
 
 
 class OptimizationSession(Base):
@@ -121,6 +130,11 @@ class SessionHistory(Base):
     
     # 关系
     session = relationship("OptimizationSession", back_populates="history")
+    
+    __table_args__ = (
+        # 每个会话每个阶段只保留一条压缩记录，供 UPSERT 使用
+        Index("uq_session_history_stage", "session_id", "stage", "is_compressed", unique=True),
+    )
 
 
 class ChangeLog(Base):
@@ -137,6 +151,18 @@ class ChangeLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class ResponseCache(Base):
+    """AI 响应缓存表 (相同阶段、模型、提示词和输入时复用结果)"""
+    __tablename__ = "response_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, index=True, nullable=False)  # sha256(阶段|模型|提示词|输入)
+    stage = Column(String(50))
+    model = Column(String(100))
+    output_text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class QueueStatus(Base):
     """队列状态表"""
     __tablename__ = "queue_status"
@@ -13,6 +13,7 @@ from app.models.models import (
     ChangeLog,
     OptimizationSegment,
     OptimizationSession,
+    ResponseCache,
     SessionHistory,
     SystemSetting,
     User,
@@ -25,6 +26,7 @@ from app.schemas import (
     UserUsageUpdate,
 )
 from app.services.concurrency import concurrency_manager
+from app.services.session_control import session_control
 from app.word_formatter.services.job_manager import get_job_manager
 from app.utils.auth import (
     create_access_token,
@@ -62,6 +64,7 @@ ALLOWED_TABLES: Dict[str, Type] = {
     "optimization_segments": OptimizationSegment,
     "session_history": SessionHistory,
     "change_logs": ChangeLog,
+    "response_cache": ResponseCache,
     "system_settings": SystemSetting,
 }
 
@@ -259,6 +262,8 @@ async def admin_stop_session(
     session.status = "stopped"
     session.error_message = "管理员手动停止"
     db.commit()
+    # 通知本进程内正在运行的任务立即停止
+    session_control.request_stop(session_id)
     
     return {"message": "会话已停止"}
 
@@ -12,6 +12,7 @@ from app.schemas import (
 from app.services.optimization_service import OptimizationService
 from app.services.concurrency import concurrency_manager
 from app.services.stream_manager import stream_manager
+from app.services.session_control import session_control
 from app.utils.auth import generate_session_id
 from datetime import datetime
 import asyncio
@@ -244,13 +245,17 @@ async def stream_session_progress(
                 if await request.is_disconnected():
                     break
                 
+                # 队列因积压被移除后不会再有新消息，结束流让 EventSource 重新连接
+                if queue.closed and queue.empty():
+                    break
+                
                 # 从队列获取消息，设置超时以便检查连接状态
                 try:
                     message = await asyncio.wait_for(queue.get(), timeout=1.0)
                     yield message
                 except asyncio.TimeoutError:
-                    # 发送心跳注释以保持连接活跃
-                    yield ": keep-alive\n\n"
+                    # 发送心跳注释以保持连接活跃（bytes 原样发送，不会被包装成 data 字段）
+                    yield b": keep-alive\n\n"
                     
         finally:
             await stream_manager.disconnect(session_id, queue)
@@ -453,5 +458,7 @@ async def stop_session(
     session.status = "stopped"
     session.error_message = "用户手动停止"
     db.commit()
+    # 通知本进程内正在运行的任务立即停止
+    session_control.request_stop(session_id)
 
     return {"message": "会话已停止"}
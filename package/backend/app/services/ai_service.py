@@ -1,9 +1,18 @@
 from typing import List, Dict, Optional
+from itertools import chain
+import gzip
 import json
 import re
+import httpx
 from openai import AsyncOpenAI, PermissionDeniedError, AuthenticationError, RateLimitError
 from app.config import settings
 
+try:
+    import h2  # noqa: F401  # HTTP/2 为可选依赖（httpx[http2]）
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 
 # 不可重试的错误类型 - 这些错误不应该通过降级重试来解决
 NON_RETRYABLE_ERRORS = (
@@ -72,6 +81,22 @@ def get_error_category(error: Exception) -> str:
 # 流式处理中用于检测跨块标签的缓冲区大小
 THINKING_TAG_BUFFER_SIZE = 20
 
+# 预编译的正则表达式，避免在热路径上重复查找模式缓存
+_THINKING_BLOCK_PATTERNS = (
+    re.compile(r'<think>.*?</think>', re.DOTALL | re.IGNORECASE),
+    re.compile(r'<thinking>.*?</thinking>', re.DOTALL | re.IGNORECASE),
+)
+_THINKING_TAG_PATTERNS = (
+    re.compile(r'</?think>', re.IGNORECASE),
+    re.compile(r'</?thinking>', re.IGNORECASE),
+)
+_THINKING_OPEN_TAG_PATTERN = re.compile(r'<think>|<thinking>', re.IGNORECASE)
+_THINKING_CLOSE_TAG_PATTERN = re.compile(r'</think>|</thinking>', re.IGNORECASE)
+_EXTRA_BLANK_LINES_PATTERN = re.compile(r'\n\s*\n\s*\n')
+_CHINESE_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+_ENGLISH_LETTER_PATTERN = re.compile(r'[a-zA-Z]')
+_SENTENCE_SPLIT_PATTERN = re.compile(r'([。!?;])')
+
 
 def remove_thinking_tags(text: str) -> str:
     """移除 AI 模型输出的思考标签
@@ -90,19 +115,68 @@ def remove_thinking_tags(text: str) -> str:
     
     # 移除 <think>...</think> 和 <thinking>...</thinking> 标签及其内容
     # 使用 DOTALL 标志使 . 匹配换行符
-    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r'<thinking>.*?</thinking>', '', text, flags=re.DOTALL | re.IGNORECASE)
+    for pattern in _THINKING_BLOCK_PATTERNS:
+        text = pattern.sub('', text)
     
     # 移除可能残留的单独标签
-    text = re.sub(r'</?think>', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'</?thinking>', '', text, flags=re.IGNORECASE)
+    for pattern in _THINKING_TAG_PATTERNS:
+        text = pattern.sub('', text)
     
     # 清理可能产生的多余空白
-    text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
+    text = _EXTRA_BLANK_LINES_PATTERN.sub('\n\n', text)
     
     return text.strip()
 
 
+async def _gzip_request_body(request: httpx.Request) -> None:
+    """httpx 请求钩子：启用请求体压缩时对较大的请求体进行 gzip 压缩
+
+    润色/增强的系统提示词每个段落都会完整发送一次，压缩后可显著减少上传字节数。
+    使用最低压缩级别，CPU 开销相对网络往返可以忽略。以请求钩子而非自定义传输层实现，
+    httpx 仍会按 HTTP(S)_PROXY/ALL_PROXY/NO_PROXY 环境变量选择代理；每次请求时读取配置，
+    管理后台修改压缩设置后无需重建客户端。
+    """
+    if not settings.REQUEST_GZIP_ENABLED or "content-encoding" in request.headers:
+        return
+    body = await request.aread()
+    if len(body) > settings.REQUEST_GZIP_MIN_BYTES:
+        compressed = gzip.compress(body, compresslevel=1)
+        request.headers["Content-Encoding"] = "gzip"
+        request.headers["Content-Length"] = str(len(compressed))
+        request.stream = httpx.ByteStream(compressed)
+
+
+# 进程内共享的 HTTP 客户端，应用关闭时由 close_shared_http_client 关闭
+_shared_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_shared_http_client() -> httpx.AsyncClient:
+    """获取进程内共享的 HTTP 客户端
+
+    所有 AIService 复用同一个连接池，避免每个会话、每个服务各自建立 TCP/TLS 连接；
+    可用时启用 HTTP/2 多路复用。客户端在首次使用时创建，整个进程只有一个实例。
+    """
+    global _shared_http_client
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        # 不显式传入 transport，httpx 才会按 HTTP(S)_PROXY/ALL_PROXY 环境变量配置代理；
+        # 响应压缩由 httpx 默认的 Accept-Encoding 处理
+        _shared_http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=60.0,
+            event_hooks={"request": [_gzip_request_body]}
+        )
+    return _shared_http_client
+
+
+async def close_shared_http_client():
+    """关闭共享的 HTTP 客户端"""
+    global _shared_http_client
+    client, _shared_http_client = _shared_http_client, None
+    if client is not None:
+        await client.aclose()
+
+
 class AIService:
     """AI 服务类"""
     
@@ -127,7 +201,7 @@ class AIService:
             raise Exception("Base URL 未配置，无法初始化 AI 服务")
         
         try:
-            # 初始化 OpenAI 客户端
+            # 初始化 OpenAI 客户端（复用共享的 HTTP 连接池）
             self.client = AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=self.base_url,
@@ -135,7 +209,8 @@ class AIService:
                 max_retries=2,
                 default_headers={
                     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-                }
+                },
+                http_client=get_shared_http_client()
             )
             
             # 启用所有API请求的日志记录
@@ -228,14 +303,14 @@ class AIService:
                         )
                     raise
 
-            full_response = ""  # 收集完整响应
+            response_parts = []  # 收集完整响应，结束时再拼接
             in_thinking_tag = False  # 跟踪是否在思考标签内
             thinking_buffer = ""  # 暂存可能的思考内容
             
             async for chunk in stream:
                 if chunk.choices and chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
-                    full_response += content
+                    response_parts.append(content)
                     
                     # 检测和过滤思考标签
                     # 将内容添加到缓冲区以检测标签
@@ -245,7 +320,7 @@ class AIService:
                     if not in_thinking_tag and ('<think>' in thinking_buffer.lower() or '<thinking>' in thinking_buffer.lower()):
                         in_thinking_tag = True
                         # 输出标签之前的内容
-                        before_tag = re.split(r'<think>|<thinking>', thinking_buffer, flags=re.IGNORECASE)[0]
+                        before_tag = _THINKING_OPEN_TAG_PATTERN.split(thinking_buffer)[0]
                         if before_tag:
                             yield before_tag
                         thinking_buffer = ""
@@ -255,7 +330,7 @@ class AIService:
                     if in_thinking_tag and ('</think>' in thinking_buffer.lower() or '</thinking>' in thinking_buffer.lower()):
                         in_thinking_tag = False
                         # 清空缓冲区，跳过标签后的内容
-                        thinking_buffer = re.split(r'</think>|</thinking>', thinking_buffer, flags=re.IGNORECASE)[-1]
+                        thinking_buffer = _THINKING_CLOSE_TAG_PATTERN.split(thinking_buffer)[-1]
                         continue
                     
                     # 如果不在思考标签内，输出内容
@@ -275,6 +350,7 @@ class AIService:
             
             # 流式响应完成后，记录完整响应（包含思考标签）
             if self._enable_logging:
+                full_response = "".join(response_parts)
                 print("\n" + "="*80, flush=True)
                 print("[STREAM RESPONSE] Complete Response (with thinking tags):", flush=True)
                 print(full_response, flush=True)
@@ -509,23 +585,22 @@ class AIService:
         只压缩AI的回复内容（assistant消息），不包含用户的原始输入。
         这样可以提取AI处理后的风格和特征，用于后续段落的参考。
         """
-        # 只提取assistant消息的内容进行压缩
-        assistant_contents = [
-            msg['content'] 
-            for msg in history 
-            if msg.get('role') == 'assistant' and msg.get('content')
-        ]
-        
-        # 如果有system消息（已压缩的内容），也包含进来
-        system_contents = [
-            msg['content']
-            for msg in history
-            if msg.get('role') == 'system' and msg.get('content')
-        ]
+        # 单次遍历：只提取assistant消息的内容进行压缩，
+        # 如果有system消息（已压缩的内容），也包含进来并排在前面
+        system_contents = []
+        assistant_contents = []
+        for msg in history:
+            content = msg.get('content')
+            if not content:
+                continue
+            role = msg.get('role')
+            if role == 'system':
+                system_contents.append(content)
+            elif role == 'assistant':
+                assistant_contents.append(content)
         
         # 合并所有内容
-        all_contents = system_contents + assistant_contents
-        history_text = "\n\n---段落分隔---\n\n".join(all_contents)
+        history_text = "\n\n---段落分隔---\n\n".join(chain(system_contents, assistant_contents))
         
         messages = [
             {
@@ -543,8 +618,7 @@ class AIService:
 
 def count_chinese_characters(text: str) -> int:
     """统计汉字数量"""
-    chinese_pattern = re.compile(r'[\u4e00-\u9fff]')
-    return len(chinese_pattern.findall(text))
+    return len(_CHINESE_CHAR_PATTERN.findall(text))
 
 
 def count_text_length(text: str) -> int:
@@ -554,16 +628,14 @@ def count_text_length(text: str) -> int:
     对于英文文本，统计字母数量
     对于混合文本，优先统计汉字数量
     """
-    chinese_pattern = re.compile(r'[\u4e00-\u9fff]')
-    chinese_count = len(chinese_pattern.findall(text))
+    chinese_count = len(_CHINESE_CHAR_PATTERN.findall(text))
     
     # 如果有汉字，返回汉字数量（中文文本或中英混合）
     if chinese_count > 0:
         return chinese_count
     
     # 纯英文文本，统计字母数量
-    english_pattern = re.compile(r'[a-zA-Z]')
-    return len(english_pattern.findall(text))
+    return len(_ENGLISH_LETTER_PATTERN.findall(text))
 
 
 def split_text_into_segments(text: str, max_chars: int = 500) -> List[str]:
@@ -585,21 +657,36 @@ def split_text_into_segments(text: str, max_chars: int = 500) -> List[str]:
             segments.append(para)
         else:
             # 段落过长,按句子分割
-            sentences = re.split(r'([。!?;])', para)
-            current_segment = ""
+            # 增量累计汉字数和字母数，每个句子只统计一次，
+            # 结果与对拼接后的文本调用 count_text_length 一致
+            sentences = _SENTENCE_SPLIT_PATTERN.split(para)
+            current_parts: List[str] = []
+            current_chinese = 0
+            current_letters = 0
             
             for i in range(0, len(sentences), 2):
                 sentence = sentences[i]
                 if i + 1 < len(sentences):
                     sentence += sentences[i + 1]  # 加上标点
                 
-                if count_text_length(current_segment + sentence) <= max_chars:
-                    current_segment += sentence
+                sentence_chinese = count_chinese_characters(sentence)
+                sentence_letters = len(_ENGLISH_LETTER_PATTERN.findall(sentence))
+                chinese = current_chinese + sentence_chinese
+                letters = current_letters + sentence_letters
+                
+                if (chinese if chinese > 0 else letters) <= max_chars:
+                    current_parts.append(sentence)
+                    current_chinese = chinese
+                    current_letters = letters
                 else:
+                    current_segment = "".join(current_parts)
                     if current_segment:
                         segments.append(current_segment)
-                    current_segment = sentence
+                    current_parts = [sentence]
+                    current_chinese = sentence_chinese
+                    current_letters = sentence_letters
             
+            current_segment = "".join(current_parts)
             if current_segment:
                 segments.append(current_segment)
     
@@ -1,6 +1,6 @@
 import asyncio
-from typing import Optional, Dict, List
-from datetime import datetime
+import time
+from typing import Optional, Dict, List, Tuple
 from app.config import settings
 
 # 等待并发权限的最大超时时间（秒）
@@ -12,8 +12,11 @@ class ConcurrencyManager:
     
     def __init__(self, max_concurrent: int = None):
         self.max_concurrent = max_concurrent or settings.MAX_CONCURRENT_USERS
-        self.active_sessions: Dict[str, datetime] = {}
+        # session_id -> 获得执行权限时的单调时钟时间戳 (time.monotonic_ns)
+        self.active_sessions: Dict[str, int] = {}
         self.queue: List[str] = []
+        # 队列只读快照，仅在持有锁时重建，供 get_status 无锁读取
+        self._queue_snapshot: Tuple[str, ...] = ()
         self._lock = asyncio.Lock()
         self._condition = asyncio.Condition(self._lock)  # 添加条件变量
     
@@ -33,22 +36,24 @@ class ConcurrencyManager:
                 return True
             
             if len(self.active_sessions) < self.max_concurrent:
-                self.active_sessions[session_id] = datetime.utcnow()
+                self.active_sessions[session_id] = time.monotonic_ns()
                 return True
 
             if session_id not in self.queue:
                 self.queue.append(session_id)
+                self._refresh_queue_snapshot_locked()
             
             # 等待被唤醒，设置超时防止无限等待
-            start_time = datetime.utcnow()
+            start_time = time.monotonic()
             while session_id not in self.active_sessions and session_id in self.queue:
                 try:
                     # 使用 wait_for 设置超时
-                    remaining_timeout = timeout - (datetime.utcnow() - start_time).total_seconds()
+                    remaining_timeout = timeout - (time.monotonic() - start_time)
                     if remaining_timeout <= 0:
                         # 超时，从队列中移除
                         if session_id in self.queue:
                             self.queue.remove(session_id)
+                            self._refresh_queue_snapshot_locked()
                         return False
                     await asyncio.wait_for(self._condition.wait(), timeout=min(remaining_timeout, 60))
                 except asyncio.TimeoutError:
@@ -65,29 +70,33 @@ class ConcurrencyManager:
             if session_id in self.queue:
                 self.queue.remove(session_id)
             self._activate_waiting_locked()
+            self._refresh_queue_snapshot_locked()
             self._condition.notify_all()  # 唤醒所有等待者
     
     async def get_status(self, session_id: Optional[str] = None) -> Dict:
-        """获取队列状态"""
-        async with self._lock:
-            current_users = len(self.active_sessions)
-            queue_list = list(self.queue)
-            
-            status = {
-                "current_users": current_users,
-                "max_users": self.max_concurrent,
-                "queue_length": len(queue_list),
-                "your_position": None,
-                "estimated_wait_time": None
-            }
-            
-            if session_id and session_id in queue_list:
-                position = queue_list.index(session_id) + 1
-                status["your_position"] = position
-                # 估算等待时间(假设每个任务平均5分钟)
-                status["estimated_wait_time"] = position * 300
-            
-            return status
+        """获取队列状态
+
+        无锁读取：快照只在持有锁时整体替换，状态接口允许落后一次操作，
+        避免轮询请求与 acquire/release 争用锁。
+        """
+        queue_snapshot = self._queue_snapshot
+        current_users = len(self.active_sessions)
+
+        status = {
+            "current_users": current_users,
+            "max_users": self.max_concurrent,
+            "queue_length": len(queue_snapshot),
+            "your_position": None,
+            "estimated_wait_time": None
+        }
+
+        if session_id and session_id in queue_snapshot:
+            position = queue_snapshot.index(session_id) + 1
+            status["your_position"] = position
+            # 估算等待时间(假设每个任务平均5分钟)
+            status["estimated_wait_time"] = position * 300
+
+        return status
     
     def is_active(self, session_id: str) -> bool:
         """检查会话是否活跃"""
@@ -102,13 +111,18 @@ class ConcurrencyManager:
         async with self._condition:
             self.max_concurrent = max(1, new_limit)
             self._activate_waiting_locked()
+            self._refresh_queue_snapshot_locked()
             self._condition.notify_all()  # 唤醒所有等待者以检查新的限制
 
     def _activate_waiting_locked(self):
         """尝试为等待队列中的会话分配执行权限 (需持有锁)"""
         while self.queue and len(self.active_sessions) < self.max_concurrent:
             next_session = self.queue.pop(0)
-            self.active_sessions[next_session] = datetime.utcnow()
+            self.active_sessions[next_session] = time.monotonic_ns()
+
+    def _refresh_queue_snapshot_locked(self):
+        """重建队列只读快照 (需持有锁)"""
+        self._queue_snapshot = tuple(self.queue)
 
 
 # 全局并发管理器实例
@@ -1,11 +1,15 @@
 import json
 import asyncio
-from typing import List, Dict, Optional
+import hashlib
+import time
+from functools import partial
+from typing import List, Dict, Optional, Tuple, Union
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, insert
+from sqlalchemy.orm import Session, raiseload
 from app.models.models import (
     OptimizationSession, OptimizationSegment, 
-    SessionHistory, ChangeLog
+    SessionHistory, ChangeLog, ResponseCache
 )
 from app.services.ai_service import (
     AIService, split_text_into_segments,
@@ -14,11 +18,70 @@ from app.services.ai_service import (
 )
 from app.services.concurrency import concurrency_manager
 from app.services.stream_manager import stream_manager
+from app.services.session_control import session_control
 from app.config import settings
+from app.database import UPSERT_INSERTS
 
 # 错误信息最大长度，避免数据库字段溢出
 MAX_ERROR_MESSAGE_LENGTH = 500
 
+# 进度写入数据库的最小间隔（秒），期间的进度只通过流式连接推送
+PROGRESS_COMMIT_INTERVAL = 1.0
+
+# 回查数据库停止状态的间隔（秒），用于感知其他进程发起的停止
+STOP_CHECK_INTERVAL = 5.0
+
+# 各阶段的默认提示词（未知阶段按 enhance 处理）
+STAGE_PROMPT_FACTORIES = {
+    "polish": get_default_polish_prompt,
+    "emotion_polish": get_emotion_polish_prompt,
+    "enhance": get_default_enhance_prompt,
+}
+
+# 感情文章的历史压缩提示词
+EMOTION_COMPRESSION_PROMPT = """你是一个专业的文本摘要助手。请压缩以下历史处理内容，提取关键风格特征：
+
+1. 总结文本的表达风格和语言特点
+2. 提取关键的修改方向和处理模式
+3. 保留重要的词汇使用倾向
+4. 删除重复的内容和冗余表述
+
+要求：
+- 压缩后内容不超过原内容的30%
+- 只输出压缩后的摘要，不要添加任何解释和注释
+
+历史处理内容："""
+
+# 学术论文的历史压缩提示词（默认）
+ACADEMIC_COMPRESSION_PROMPT = """你是一个专业的学术文本摘要助手。请压缩以下历史处理内容，提取关键信息：
+
+1. 保留论文的主要术语、核心概念和关键数据
+2. 总结已处理段落的主题和要点
+3. 提取处理风格和改进方向的关键特征
+4. 删除重复内容和冗余表述
+
+要求：
+- 压缩后内容不超过原内容的30%
+- 保持学术性和专业性
+- 只输出压缩后的摘要文本，不要添加任何解释和注释
+
+
+历史处理内容："""
+
+COMPRESSION_PROMPTS = {
+    "emotion_polish": EMOTION_COMPRESSION_PROMPT,
+}
+
+
+
+def response_cache_key(stage: str, model: str, prompt: str, input_text: str) -> str:
+    """计算 AI 响应缓存键"""
+    return hashlib.sha256(f"{stage}|{model}|{prompt}|{input_text}".encode("utf-8")).hexdigest()
+
+# 流式内容合并推送的阈值：累积字符数或间隔（秒）任一达到即推送
+STREAM_FLUSH_CHARS = 32
+STREAM_FLUSH_INTERVAL = 0.05
+
 
 class OptimizationService:
     """优化处理服务"""
@@ -30,6 +93,15 @@ class OptimizationService:
         self.enhance_service: Optional[AIService] = None
         self.emotion_service: Optional[AIService] = None
         self.compression_service: Optional[AIService] = None
+        # 已修改但尚未提交的段落数，累计到 DB_COMMIT_BATCH_SIZE 后统一提交
+        self._uncommitted_segments = 0
+        # 上次提交进度的单调时钟时间
+        self._last_progress_commit = 0.0
+        # 进程内停止信号，由停止接口设置
+        self._stop_event: Optional[asyncio.Event] = None
+        self._last_stop_check = 0.0
+        # 当前阶段已有的变更记录: (段落序号, 阶段) -> 记录ID，本次新建的记录直接保存对象
+        self._changelog_entries: Dict[Tuple[int, str], Union[int, ChangeLog]] = {}
     
     def _init_ai_services(self):
         """初始化AI服务
@@ -77,6 +149,7 @@ class OptimizationService:
     
     async def start_optimization(self):
         """开始优化流程"""
+        self._stop_event = session_control.register(self.session_obj.session_id)
         try:
             # 初始化AI服务
             self._init_ai_services()
@@ -84,13 +157,13 @@ class OptimizationService:
             # 重置错误状态
             self.session_obj.error_message = None
             self.session_obj.failed_segment_index = None
-            self.db.commit()
+            await self._commit()
             
             # 获取并发权限
             acquired = await concurrency_manager.acquire(self.session_obj.session_id)
             if not acquired:
                 self.session_obj.status = "queued"
-                self.db.commit()
+                await self._commit()
                 
                 # 等待获取权限 - acquire 方法内部已包含等待逻辑
                 acquired = await concurrency_manager.acquire(self.session_obj.session_id)
@@ -99,7 +172,7 @@ class OptimizationService:
             
             # 更新状态为处理中
             self.session_obj.status = "processing"
-            self.db.commit()
+            await self._commit()
             
             # 检查是否已存在段落,避免重复创建
             # 在每次循环前检查会话状态，如果被停止则中断执行
@@ -107,30 +180,33 @@ class OptimizationService:
             if self.session_obj.status == "stopped":
                 raise Exception("会话已被用户停止")
 
-            existing_segments = self.db.query(OptimizationSegment).filter(
+            # 只统计数量，段落内容由 _process_stage 按需加载
+            existing_count = self.db.query(func.count(OptimizationSegment.id)).filter(
                 OptimizationSegment.session_id == self.session_obj.id
-            ).order_by(OptimizationSegment.segment_index).all()
+            ).scalar()
 
-            if not existing_segments:
+            if not existing_count:
                 # 首次运行: 分割文本并创建段落记录
                 segments = split_text_into_segments(self.session_obj.original_text)
                 self.session_obj.total_segments = len(segments)
-                self.db.commit()
-
-                for idx, segment_text in enumerate(segments):
-                    segment = OptimizationSegment(
-                        session_id=self.session_obj.id,
-                        segment_index=idx,
-                        stage="polish",
-                        original_text=segment_text,
-                        status="pending"
-                    )
-                    self.db.add(segment)
-                self.db.commit()
+
+                # 批量插入所有段落，与总段落数一起提交
+                if segments:
+                    self.db.execute(insert(OptimizationSegment), [
+                        {
+                            "session_id": self.session_obj.id,
+                            "segment_index": idx,
+                            "stage": "polish",
+                            "original_text": segment_text,
+                            "status": "pending"
+                        }
+                        for idx, segment_text in enumerate(segments)
+                    ])
+                await self._commit()
             else:
                 # 继续运行: 同步总段落数
-                self.session_obj.total_segments = len(existing_segments)
-                self.db.commit()
+                self.session_obj.total_segments = existing_count
+                await self._commit()
             
             # 根据处理模式执行不同的阶段
             processing_mode = self.session_obj.processing_mode or 'paper_polish_enhance'
@@ -156,7 +232,7 @@ class OptimizationService:
             self.session_obj.completed_at = datetime.utcnow()
             self.session_obj.progress = 100.0
             self.session_obj.failed_segment_index = None
-            self.db.commit()
+            await self._commit()
             
         except Exception as e:
             self.session_obj.status = "failed"
@@ -165,9 +241,10 @@ class OptimizationService:
             if len(error_msg) > MAX_ERROR_MESSAGE_LENGTH:
                 error_msg = error_msg[:MAX_ERROR_MESSAGE_LENGTH - 50] + "... [错误信息已截断]"
             self.session_obj.error_message = error_msg
-            self.db.commit()
+            await self._commit()
             raise
         finally:
+            session_control.unregister(self.session_obj.session_id, self._stop_event)
             # 释放并发权限
             await concurrency_manager.release(self.session_obj.session_id)
             # 清理 AI 服务资源
@@ -187,7 +264,7 @@ class OptimizationService:
         print(f"\n[STAGE START] Stage: {stage}, Session: {self.session_obj.session_id}", flush=True)
         
         self.session_obj.current_stage = stage
-        self.db.commit()
+        await self._commit()
         
         # 获取该阶段的提示词
         prompt = self._get_prompt(stage)
@@ -200,11 +277,6 @@ class OptimizationService:
         else:  # enhance
             ai_service = self.enhance_service
         
-        # 获取所有段落
-        segments = self.db.query(OptimizationSegment).filter(
-            OptimizationSegment.session_id == self.session_obj.id
-        ).order_by(OptimizationSegment.segment_index).all()
-        
         # 如果存在失败段落，跳过已完成的段落
         start_index = 0
         if self.session_obj.failed_segment_index is not None:
@@ -215,32 +287,65 @@ class OptimizationService:
         history: List[Dict[str, str]] = []
         total_chars = 0
 
-        for segment in segments[:start_index]:
-            if segment.is_title:
-                # 标题段落不参与历史上下文
+        # 历史只需要该阶段的输出文本，按列查询，不构建完整的 ORM 对象
+        text_column = (
+            OptimizationSegment.enhanced_text if stage == "enhance"
+            else OptimizationSegment.polished_text
+        )
+        history_rows = []
+        if start_index > 0:
+            history_rows = self.db.execute(
+                select(text_column, OptimizationSegment.is_title)
+                .where(OptimizationSegment.session_id == self.session_obj.id)
+                .order_by(OptimizationSegment.segment_index)
+                .limit(start_index)
+            ).all()
+
+        for text, is_title in history_rows:
+            # 标题段落不参与历史上下文
+            if is_title or not text:
                 continue
-            if stage == "polish" and segment.polished_text:
-                history.append({"role": "assistant", "content": segment.polished_text})
-                total_chars += count_chinese_characters(segment.polished_text)
-            elif stage == "emotion_polish" and segment.polished_text:
-                history.append({"role": "assistant", "content": segment.polished_text})
-                total_chars += count_chinese_characters(segment.polished_text)
-            elif stage == "enhance" and segment.enhanced_text:
-                history.append({"role": "assistant", "content": segment.enhanced_text})
-                total_chars += count_chinese_characters(segment.enhanced_text)
+            history.append({"role": "assistant", "content": text})
+            total_chars += count_chinese_characters(text)
         
         print(f"[STAGE] Loaded {len(history)} history messages from segments[:start_index={start_index}]", flush=True)
+
+        # 待处理段落（禁止隐式懒加载关联对象）
+        segments = self.db.query(OptimizationSegment).options(raiseload('*')).filter(
+            OptimizationSegment.session_id == self.session_obj.id
+        ).order_by(OptimizationSegment.segment_index).offset(start_index).all()
+        total_segments = len(history_rows) + len(segments)
+
+        # 一次性加载该阶段已有的变更记录，避免每个段落单独查询（同一段落有多条时以最新的为准）
+        self._changelog_entries = {
+            (segment_index, stage): log_id
+            for log_id, segment_index in self.db.execute(
+                select(ChangeLog.id, ChangeLog.segment_index)
+                .where(ChangeLog.session_id == self.session_obj.id, ChangeLog.stage == stage)
+                .order_by(ChangeLog.created_at)
+            ).all()
+        }
         
         skip_threshold = max(settings.SEGMENT_SKIP_THRESHOLD, 0)
+        # 预先判断各段落是否为标题/短段落；字数统计不会超过字符串长度，
+        # 所以总长度已低于阈值时无需再用正则统计
+        short_mask = [
+            len(segment.original_text) < skip_threshold
+            or count_text_length(segment.original_text) < skip_threshold
+            for segment in segments
+        ]
+        # 并发窗口大小：窗口内的段落共享窗口开始时的历史上下文，1 表示严格按顺序处理
+        window_size = max(settings.SEGMENT_CONCURRENCY, 1)
 
         # 获取处理模式，用于正确计算进度
         processing_mode = self.session_obj.processing_mode or 'paper_polish_enhance'
 
-        for idx, segment in enumerate(segments[start_index:], start=start_index):
+        # 待处理窗口: (段落序号, 段落, 输入文本)
+        window: List[Tuple[int, OptimizationSegment, str]] = []
+
+        for idx, (segment, is_short) in enumerate(zip(segments, short_mask), start=start_index):
             # 每次处理段落前检查会话状态
-            self.db.refresh(self.session_obj)
-            if self.session_obj.status == "stopped":
-                raise Exception("会话已被用户停止")
+            self._check_stopped()
 
             # 更新进度（无论是否跳过都更新）
             self.session_obj.current_position = idx
@@ -248,18 +353,18 @@ class OptimizationService:
             if processing_mode == 'paper_polish_enhance':
                 if stage == "polish":
                     # 第一阶段占 0-50%
-                    progress = (idx / len(segments)) * 50
+                    progress = (idx / total_segments) * 50
                 else:  # enhance
                     # 第二阶段占 50-100%
-                    progress = 50 + (idx / len(segments)) * 50
+                    progress = 50 + (idx / total_segments) * 50
             else:
                 # 其他模式占 0-100%
-                progress = (idx / len(segments)) * 100
+                progress = (idx / total_segments) * 100
             self.session_obj.progress = min(progress, 100.0)
-            self.db.commit()
+            await self._report_progress(stage)
 
             # 先判断标题和短段落（提前到这里）
-            if count_text_length(segment.original_text) < skip_threshold:
+            if is_short:
                 if not segment.is_title:
                     segment.is_title = True
                     segment.status = "completed"
@@ -267,7 +372,7 @@ class OptimizationService:
                     segment.enhanced_text = segment.original_text
                     segment.completed_at = datetime.utcnow()
                     segment.stage = stage
-                    self.db.commit()
+                    await self._commit_segment_batch()
                 continue
 
             # 然后检查是否已处理
@@ -280,55 +385,146 @@ class OptimizationService:
                     segment.enhanced_text = segment.polished_text or segment.original_text
                     segment.status = "completed"
                     segment.completed_at = segment.completed_at or datetime.utcnow()
-                    self.db.commit()
+                    await self._commit_segment_batch()
                     continue
 
-            try:
+            # 准备输入文本
+            # 对于 enhance 阶段：如果有润色结果则使用，否则使用原文（适用于 paper_enhance 模式）
+            if stage == "enhance":
+                input_text = segment.polished_text if segment.polished_text else segment.original_text
+            else:
+                input_text = segment.original_text
 
-                print(f"\n[SEGMENT {idx}] Processing segment {idx+1}/{len(segments)}, Stage: {stage}", flush=True)
-                print(f"[SEGMENT {idx}] Input Length: {count_text_length(segment.original_text)}", flush=True)
-                
-                segment.status = "processing"
-                segment.stage = stage
-                self.db.commit()
-                
-                # 准备输入文本
-                # 对于 enhance 阶段：如果有润色结果则使用，否则使用原文（适用于 paper_enhance 模式）
-                if stage == "enhance":
-                    input_text = segment.polished_text if segment.polished_text else segment.original_text
-                else:
-                    input_text = segment.original_text
-                
-                # 调用AI
-                async def execute_call():
-                    # 使用配置中的流式设置，默认非流式（False）以避免API阻止
-                    use_stream = settings.USE_STREAMING
-                    
-                    if stage == "polish":
-                        response = await ai_service.polish_text(input_text, prompt, history, stream=use_stream)
-                    elif stage == "emotion_polish":
-                        response = await ai_service.polish_emotion_text(input_text, prompt, history, stream=use_stream)
-                    else:  # enhance
-                        response = await ai_service.enhance_text(input_text, prompt, history, stream=use_stream)
-                    
-                    if use_stream:
-                        full_text = ""
-                        async for chunk in response:
-                            if chunk:
-                                full_text += chunk
-                                # 推送流式更新
-                                await stream_manager.broadcast(self.session_obj.session_id, {
-                                    "type": "content",
-                                    "segment_index": idx,
-                                    "stage": stage,
-                                    "content": chunk,
-                                    "full_text": full_text  # 可选:发送全量或增量，这里发送增量chunk，全量用于恢复
-                                })
-                        return full_text
-                    else:
-                        return response
-
-                output_text = await self._run_with_retry(idx, stage, execute_call)
+            window.append((idx, segment, input_text))
+            if len(window) >= window_size:
+                history, total_chars = await self._process_window(
+                    window, stage, ai_service, prompt, history, total_chars, total_segments
+                )
+                window = []
+
+        if window:
+            await self._process_window(
+                window, stage, ai_service, prompt, history, total_chars, total_segments
+            )
+
+        # 阶段结束时提交剩余的段落结果
+        await self._commit_segment_batch(force=True)
+
+    def _check_stopped(self):
+        """检查会话是否已被停止，已停止时抛出异常
+
+        优先检查进程内停止事件；数据库状态最多每 STOP_CHECK_INTERVAL 秒回查一次
+        （只刷新 status，保留尚未提交的进度）。
+        """
+        if not self._stop_event.is_set():
+            now = time.monotonic()
+            if now - self._last_stop_check < STOP_CHECK_INTERVAL:
+                return
+            self._last_stop_check = now
+            self.db.refresh(self.session_obj, attribute_names=["status"])
+            if self.session_obj.status != "stopped":
+                return
+        raise Exception("会话已被用户停止")
+
+    async def _report_progress(self, stage: str):
+        """推送当前进度，并按时间间隔节流写入数据库
+
+        进度始终通过流式连接实时推送；数据库中的进度最多每
+        PROGRESS_COMMIT_INTERVAL 秒提交一次，其余时间随下一次提交一起写入。
+        """
+        now = time.monotonic()
+        if now - self._last_progress_commit >= PROGRESS_COMMIT_INTERVAL:
+            await self._commit()
+            self._last_progress_commit = now
+
+        await stream_manager.broadcast(self.session_obj.session_id, {
+            "type": "progress",
+            "stage": stage,
+            "progress": self.session_obj.progress,
+            "current_position": self.session_obj.current_position
+        })
+
+    async def _commit(self):
+        """在线程池中提交事务，避免同步的数据库写入阻塞事件循环
+
+        提交期间当前协程处于挂起状态，self.db 不会被并发访问。
+        任何一次提交都会写入此前累计的段落，因此同时清零批量计数。
+        """
+        await asyncio.to_thread(self.db.commit)
+        self._uncommitted_segments = 0
+
+    async def _commit_segment_batch(self, force: bool = False):
+        """累计段落写入，达到批量大小（或强制）时统一提交
+
+        段落结果和变更记录随同一次提交写入，避免每个段落单独提交带来的
+        事务开销；失败和停止路径仍会立即提交。按时间节流的进度提交
+        （见 _report_progress）同样会写入已累计的段落并重新开始计数。
+        """
+        if not force:
+            self._uncommitted_segments += 1
+            if self._uncommitted_segments < max(settings.DB_COMMIT_BATCH_SIZE, 1):
+                return
+        await self._commit()
+
+    async def _process_window(
+        self,
+        window: List[Tuple[int, OptimizationSegment, str]],
+        stage: str,
+        ai_service: AIService,
+        prompt: str,
+        history: List[Dict[str, str]],
+        total_chars: int,
+        total_segments: int
+    ) -> Tuple[List[Dict[str, str]], int]:
+        """处理一个窗口内的段落
+        
+        窗口内的 AI 调用并发执行，并共享窗口开始时的历史上下文；
+        数据库写入、历史更新和压缩仍按段落顺序依次完成。
+        窗口大小为 1 时与逐段顺序处理完全一致。
+        
+        Returns:
+            更新后的 (历史会话, 历史汉字数)
+        """
+        for idx, segment, _ in window:
+            print(f"\n[SEGMENT {idx}] Processing segment {idx+1}/{total_segments}, Stage: {stage}", flush=True)
+            print(f"[SEGMENT {idx}] Input Length: {count_text_length(segment.original_text)}", flush=True)
+            # 处理中状态随下一次提交写入，不单独提交
+            segment.status = "processing"
+            segment.stage = stage
+
+        # 命中缓存的段落直接使用缓存结果，不再调用 AI
+        cache_keys: List[Optional[str]] = [None] * len(window)
+        cached_outputs: Dict[str, str] = {}
+        if settings.RESPONSE_CACHE_ENABLED:
+            cache_keys = [
+                response_cache_key(stage, ai_service.model, prompt, input_text)
+                for _, _, input_text in window
+            ]
+            cached_outputs = dict(self.db.execute(
+                select(ResponseCache.cache_key, ResponseCache.output_text)
+                .where(ResponseCache.cache_key.in_(cache_keys))
+            ).all())
+
+        # 窗口内所有段落使用同一份历史快照，避免并发调用期间历史被修改
+        history_snapshot = list(history)
+        results = await asyncio.gather(
+            *(
+                self._run_with_retry(
+                    idx, stage,
+                    partial(self._use_cached_response, idx, stage, cached_outputs[key])
+                    if key in cached_outputs else
+                    partial(self._execute_call, idx, stage, ai_service, prompt, input_text, history_snapshot)
+                )
+                for (idx, _, input_text), key in zip(window, cache_keys)
+            ),
+            return_exceptions=True
+        )
+
+        for position, ((idx, segment, input_text), result) in enumerate(zip(window, results)):
+            try:
+                if isinstance(result, BaseException):
+                    raise result
+                output_text = result
 
                 if stage in ["polish", "emotion_polish"]:
                     segment.polished_text = output_text
@@ -337,10 +533,13 @@ class OptimizationService:
 
                 segment.status = "completed"
                 segment.completed_at = datetime.utcnow()
-                self.db.commit()
                 
-                # 记录变更
+                # 记录变更（和新的缓存结果），与段落结果一起批量提交
                 await self._record_change(segment, input_text, output_text, stage)
+                key = cache_keys[position]
+                if key is not None and key not in cached_outputs:
+                    self._store_cached_response(key, stage, ai_service.model, output_text)
+                await self._commit_segment_batch()
                 
                 # 更新历史会话 - 只添加AI的回复内容
                 history.append({"role": "assistant", "content": output_text})
@@ -378,6 +577,10 @@ class OptimizationService:
                 
                 segment.status = "failed"
                 self.session_obj.failed_segment_index = idx
+
+                # 窗口内尚未写回的段落恢复为待处理，重试时从失败段落继续
+                for _, pending_segment, _ in window[position + 1:]:
+                    pending_segment.status = "pending"
                 
                 # 安全地截断错误信息，避免数据库字段溢出
                 error_msg = str(e)
@@ -387,11 +590,93 @@ class OptimizationService:
                     error_msg = error_msg[:prefix_len] + "... [错误信息已截断]"
                 
                 self.session_obj.error_message = error_msg
-                self.db.commit()
+                await self._commit()
                 
                 # 直接抛出原异常，保留堆栈
                 raise
 
+        return history, total_chars
+
+    async def _execute_call(
+        self,
+        idx: int,
+        stage: str,
+        ai_service: AIService,
+        prompt: str,
+        input_text: str,
+        history: List[Dict[str, str]]
+    ) -> str:
+        """调用AI处理单个段落"""
+        # 使用配置中的流式设置，默认非流式（False）以避免API阻止
+        use_stream = settings.USE_STREAMING
+        
+        if stage == "polish":
+            response = await ai_service.polish_text(input_text, prompt, history, stream=use_stream)
+        elif stage == "emotion_polish":
+            response = await ai_service.polish_emotion_text(input_text, prompt, history, stream=use_stream)
+        else:  # enhance
+            response = await ai_service.enhance_text(input_text, prompt, history, stream=use_stream)
+        
+        if use_stream:
+            # 用列表收集chunk，结束时一次性拼接，避免反复拼接字符串
+            chunks: List[str] = []
+            pending_chunks: List[str] = []
+            pending_length = 0
+            loop = asyncio.get_running_loop()
+            last_flush = loop.time()
+            async for chunk in response:
+                if chunk:
+                    chunks.append(chunk)
+                    pending_chunks.append(chunk)
+                    pending_length += len(chunk)
+                    # 合并多个chunk后再推送增量，减少序列化和推送次数
+                    if (
+                        pending_length >= STREAM_FLUSH_CHARS
+                        or loop.time() - last_flush > STREAM_FLUSH_INTERVAL
+                    ):
+                        await self._broadcast_content(idx, stage, "".join(pending_chunks))
+                        pending_chunks = []
+                        pending_length = 0
+                        last_flush = loop.time()
+            if pending_chunks:
+                await self._broadcast_content(idx, stage, "".join(pending_chunks))
+            return "".join(chunks)
+        else:
+            return response
+
+    async def _use_cached_response(self, idx: int, stage: str, output_text: str) -> str:
+        """使用缓存的结果代替 AI 调用（流式模式下一次性推送全文）"""
+        print(f"[SEGMENT {idx}] Using cached response, Stage: {stage}", flush=True)
+        if settings.USE_STREAMING:
+            await self._broadcast_content(idx, stage, output_text)
+        return output_text
+
+    def _store_cached_response(self, key: str, stage: str, model: str, output_text: str):
+        """写入 AI 响应缓存（由调用方负责提交）"""
+        dialect_insert = UPSERT_INSERTS.get(self.db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            # 其他会话可能已写入相同的键，冲突时保留已有结果
+            self.db.execute(
+                dialect_insert(ResponseCache).values(
+                    cache_key=key,
+                    stage=stage,
+                    model=model,
+                    output_text=output_text,
+                    created_at=datetime.utcnow()
+                ).on_conflict_do_nothing(index_elements=["cache_key"])
+            )
+        elif self.db.query(ResponseCache.id).filter(ResponseCache.cache_key == key).first() is None:
+            self.db.add(ResponseCache(cache_key=key, stage=stage, model=model, output_text=output_text))
+
+    async def _broadcast_content(self, idx: int, stage: str, content: str):
+        """推送流式增量内容（前端负责累积）"""
+        await stream_manager.broadcast(self.session_obj.session_id, {
+            "type": "content",
+            "segment_index": idx,
+            "stage": stage,
+            "content": content
+        })
+
     async def _run_with_retry(self, segment_index: int, stage: str, task):
         """执行单次任务，不自动重试"""
         try:
@@ -403,12 +688,7 @@ class OptimizationService:
     
     def _get_prompt(self, stage: str) -> str:
         """获取提示词"""
-        if stage == "polish":
-            return get_default_polish_prompt()
-        elif stage == "emotion_polish":
-            return get_emotion_polish_prompt()
-        else:  # enhance
-            return get_default_enhance_prompt()
+        return STAGE_PROMPT_FACTORIES.get(stage, get_default_enhance_prompt)()
     
     async def _compress_history(
         self, 
@@ -431,34 +711,7 @@ class OptimizationService:
             recent_messages = history[-3:] if len(history) > 3 else history
             
             # 选择合适的压缩提示词
-            if stage == "emotion_polish":
-                compression_prompt = """你是一个专业的文本摘要助手。请压缩以下历史处理内容，提取关键风格特征：
-
-1. 总结文本的表达风格和语言特点
-2. 提取关键的修改方向和处理模式
-3. 保留重要的词汇使用倾向
-4. 删除重复的内容和冗余表述
-
-要求：
-- 压缩后内容不超过原内容的30%
-- 只输出压缩后的摘要，不要添加任何解释和注释
-
-历史处理内容："""
-            else:
-                compression_prompt = """你是一个专业的学术文本摘要助手。请压缩以下历史处理内容，提取关键信息：
-
-1. 保留论文的主要术语、核心概念和关键数据
-2. 总结已处理段落的主题和要点
-3. 提取处理风格和改进方向的关键特征
-4. 删除重复内容和冗余表述
-
-要求：
-- 压缩后内容不超过原内容的30%
-- 保持学术性和专业性
-- 只输出压缩后的摘要文本，不要添加任何解释和注释
-
-
-历史处理内容："""
+            compression_prompt = COMPRESSION_PROMPTS.get(stage, ACADEMIC_COMPRESSION_PROMPT)
 
             compressed_summary = await self.compression_service.compress_history(
                 recent_messages, 
@@ -497,30 +750,50 @@ class OptimizationService:
         if not is_compressed:
             return  # 非压缩状态不保存，减少数据库写入
         
-        # 检查是否已存在该阶段的压缩记录
-        existing = self.db.query(SessionHistory).filter(
-            SessionHistory.session_id == self.session_obj.id,
-            SessionHistory.stage == stage,
-            SessionHistory.is_compressed.is_(True)
-        ).first()
+        history_data = json.dumps(history, ensure_ascii=False)
+        dialect_insert = UPSERT_INSERTS.get(self.db.get_bind().dialect.name)
         
-        if existing:
-            # 更新现有记录
-            existing.history_data = json.dumps(history, ensure_ascii=False)
-            existing.character_count = char_count
-            existing.created_at = datetime.utcnow()
-        else:
-            # 创建新记录
-            history_obj = SessionHistory(
+        if dialect_insert is not None:
+            # 单条 UPSERT：存在该阶段的压缩记录则更新，否则插入
+            stmt = dialect_insert(SessionHistory).values(
                 session_id=self.session_obj.id,
                 stage=stage,
-                history_data=json.dumps(history, ensure_ascii=False),
+                history_data=history_data,
                 is_compressed=True,
-                character_count=char_count
+                character_count=char_count,
+                created_at=datetime.utcnow()
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["session_id", "stage", "is_compressed"],
+                set_={
+                    "history_data": stmt.excluded.history_data,
+                    "character_count": stmt.excluded.character_count,
+                    "created_at": stmt.excluded.created_at,
+                }
             )
-            self.db.add(history_obj)
+            self.db.execute(stmt)
+        else:
+            # 其他数据库：先查询再更新或插入
+            existing = self.db.query(SessionHistory).filter(
+                SessionHistory.session_id == self.session_obj.id,
+                SessionHistory.stage == stage,
+                SessionHistory.is_compressed.is_(True)
+            ).first()
+            
+            if existing:
+                existing.history_data = history_data
+                existing.character_count = char_count
+                existing.created_at = datetime.utcnow()
+            else:
+                self.db.add(SessionHistory(
+                    session_id=self.session_obj.id,
+                    stage=stage,
+                    history_data=history_data,
+                    is_compressed=True,
+                    character_count=char_count
+                ))
         
-        self.db.commit()
+        await self._commit()
     
     async def _record_change(
         self,
@@ -529,7 +802,7 @@ class OptimizationService:
         after: str,
         stage: str
     ):
-        """记录变更"""
+        """记录变更（由调用方负责提交）"""
         # 简单的变更检测
         changes = {
             "before_length": len(before),
@@ -537,19 +810,21 @@ class OptimizationService:
             "changed": before != after
         }
         
-        existing_log = self.db.query(ChangeLog).filter(
-            ChangeLog.session_id == self.session_obj.id,
-            ChangeLog.segment_index == segment.segment_index,
-            ChangeLog.stage == stage
-        ).order_by(ChangeLog.created_at.desc()).first()
-
         serialized_detail = json.dumps(changes, ensure_ascii=False)
+        key = (segment.segment_index, stage)
+        existing_log = self._changelog_entries.get(key)
 
-        if existing_log:
-            # 如果之前已经生成过同一段落同一阶段的记录，直接更新内容避免重复条目
+        # 如果之前已经生成过同一段落同一阶段的记录，直接更新内容避免重复条目
+        if isinstance(existing_log, ChangeLog):
             existing_log.before_text = before
             existing_log.after_text = after
             existing_log.changes_detail = serialized_detail
+        elif existing_log is not None:
+            self.db.query(ChangeLog).filter(ChangeLog.id == existing_log).update({
+                ChangeLog.before_text: before,
+                ChangeLog.after_text: after,
+                ChangeLog.changes_detail: serialized_detail
+            }, synchronize_session=False)
         else:
             change_log = ChangeLog(
                 session_id=self.session_obj.id,
@@ -560,4 +835,4 @@ class OptimizationService:
                 changes_detail=serialized_detail
             )
             self.db.add(change_log)
-        self.db.commit()
+            self._changelog_entries[key] = change_log
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Dict
+
+
+class SessionControlRegistry:
+    """会话控制注册表
+
+    为正在运行的优化任务保存进程内的停止信号，停止接口设置信号后，
+    处理循环无需查询数据库即可感知。多进程部署时仍需依赖数据库中的会话状态。
+    """
+
+    def __init__(self):
+        # session_id -> 停止事件
+        self._stop_events: Dict[str, asyncio.Event] = {}
+
+    def register(self, session_id: str) -> asyncio.Event:
+        """为会话注册新的停止事件"""
+        event = asyncio.Event()
+        self._stop_events[session_id] = event
+        return event
+
+    def unregister(self, session_id: str, event: asyncio.Event):
+        """注销会话的停止事件（仅当仍是同一个事件时）"""
+        if self._stop_events.get(session_id) is event:
+            del self._stop_events[session_id]
+
+    def request_stop(self, session_id: str) -> bool:
+        """通知正在运行的会话停止
+
+        Returns:
+            True 如果该会话在本进程中运行并已收到通知
+        """
+        event = self._stop_events.get(session_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+
+# 全局实例
+session_control = SessionControlRegistry()
@@ -1,62 +1,134 @@
 import asyncio
-from typing import Dict, List, Any
+from typing import Dict, Any, Optional, Tuple
 import json
 from asyncio import Queue
 
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时回退到标准库 json
+    orjson = None
+
+
+def encode_sse_message(data: Dict[str, Any]) -> bytes:
+    """将消息编码为完整的 SSE 数据帧（bytes 会被 EventSourceResponse 原样发送）"""
+    if orjson is not None:
+        return b"data: " + orjson.dumps(data) + b"\n\n"
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+# 每个连接最多缓存的消息数
+MAX_QUEUE_SIZE = 256
+# 队列已满时，单条合并后的 content 消息允许的最大字符数，超过后视为连接失效
+MAX_COALESCED_CHARS = 65536
+
+
+class ConnectionQueue(Queue):
+    """单个 SSE 连接的有界消息队列
+
+    队列已满时，与队尾同一段落、同一阶段的 content 增量会合并进队尾消息，
+    而不是直接丢弃；其他类型的消息不做合并。
+    """
+
+    def __init__(self, maxsize: int = MAX_QUEUE_SIZE):
+        super().__init__(maxsize)
+        # 队尾 content 消息的原始数据，队尾不是 content 消息时为 None
+        self._tail_content: Optional[Dict[str, Any]] = None
+        # 连接因消息积压被移除后置位，不会再收到新消息
+        self.closed = False
+
+    def close(self):
+        """标记连接已失效，消费方取完剩余消息后应结束流，让客户端重连"""
+        self.closed = True
+
+    def _put(self, item):
+        super()._put(item)
+        self._tail_content = None
+
+    def _get(self):
+        item = super()._get()
+        if not self._queue:
+            self._tail_content = None
+        return item
+
+    def put_message(self, message: bytes, data: Dict[str, Any]):
+        """非阻塞地放入消息，队列已满且无法合并时抛出 QueueFull"""
+        try:
+            self.put_nowait(message)
+        except asyncio.QueueFull:
+            if not self._coalesce(data):
+                raise
+            return
+        if data.get('type') == 'content':
+            self._tail_content = dict(data)
+
+    def _coalesce(self, data: Dict[str, Any]) -> bool:
+        """将 content 增量合并到队尾消息"""
+        tail = self._tail_content
+        if (
+            tail is None
+            or data.get('type') != 'content'
+            or tail.get('segment_index') != data.get('segment_index')
+            or tail.get('stage') != data.get('stage')
+            or len(tail['content']) >= MAX_COALESCED_CHARS
+        ):
+            return False
+        tail['content'] += data.get('content', '')
+        self._queue[-1] = encode_sse_message(tail)
+        return True
+
 class StreamManager:
     """流式响应管理器"""
     
     def __init__(self):
-        # session_id -> List[Queue]
-        self.connections: Dict[str, List[Queue]] = {}
+        # session_id -> Tuple[ConnectionQueue, ...]
+        # 连接列表采用写时复制：连接/断开时整体替换元组，广播时无需加锁即可读取
+        self.connections: Dict[str, Tuple[ConnectionQueue, ...]] = {}
         self._lock = asyncio.Lock()
     
-    async def connect(self, session_id: str) -> Queue:
+    async def connect(self, session_id: str) -> ConnectionQueue:
         """建立连接"""
         async with self._lock:
-            if session_id not in self.connections:
-                self.connections[session_id] = []
-            
-            queue = Queue()
-            self.connections[session_id].append(queue)
+            queue = ConnectionQueue()
+            self.connections[session_id] = self.connections.get(session_id, ()) + (queue,)
             return queue
     
     async def disconnect(self, session_id: str, queue: Queue):
         """断开连接"""
         async with self._lock:
-            if session_id in self.connections:
-                if queue in self.connections[session_id]:
-                    self.connections[session_id].remove(queue)
-                
-                if not self.connections[session_id]:
-                    del self.connections[session_id]
+            self._remove_queues(session_id, (queue,))
+
+    def _remove_queues(self, session_id: str, removed: Tuple[Queue, ...]):
+        """从会话的连接列表中移除队列（调用方需持有锁）"""
+        if session_id not in self.connections:
+            return
+        remaining = tuple(q for q in self.connections[session_id] if q not in removed)
+        if remaining:
+            self.connections[session_id] = remaining
+        else:
+            del self.connections[session_id]
 
     async def broadcast(self, session_id: str, data: Dict[str, Any]):
         """广播消息给指定会话的所有连接"""
-        # 不加锁以避免阻塞，只在读取连接列表时加锁（如果需要严格一致性，但这里为了性能可以放宽）
-        # 使用副本进行迭代
-        queues = []
-        async with self._lock:
-            if session_id in self.connections:
-                queues = list(self.connections[session_id])
+        # 连接元组不可变，直接读取当前快照即可，无需加锁
+        queues = self.connections.get(session_id, ())
         
         if not queues:
-            # 只记录非 content 类型的消息，避免刷屏
-            if data.get('type') != 'content':
+            # 只记录非 content/progress 类型的消息，避免刷屏
+            if data.get('type') not in ('content', 'progress'):
                 print(f"[STREAM WARNING] No active connections for session {session_id}, message type: {data.get('type')}", flush=True)
             return
 
-        message = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        message = encode_sse_message(data)
         
-        # 只记录非 content 类型的消息，避免刷屏
-        if data.get('type') != 'content':
+        # 只记录非 content/progress 类型的消息，避免刷屏
+        if data.get('type') not in ('content', 'progress'):
             print(f"[STREAM BROADCAST] Session: {session_id}, Type: {data.get('type')}, Connections: {len(queues)}", flush=True)
         
         failed_queues = []
         for queue in queues:
             try:
-                # 使用 put_nowait 避免阻塞
-                queue.put_nowait(message)
+                # 非阻塞放入，队列已满时尽量合并 content 增量
+                queue.put_message(message, data)
             except asyncio.QueueFull:
                 print(f"[STREAM ERROR] Queue full for session {session_id}, dropping message", flush=True)
                 failed_queues.append(queue)
@@ -64,12 +136,12 @@ class StreamManager:
                 print(f"[STREAM ERROR] Failed to push to queue: {e}", flush=True)
                 failed_queues.append(queue)
         
-        # 清理失败的队列
+        # 清理失败的队列（只有出现失败时才加锁）；先标记关闭，对应的流结束后客户端会重连
         if failed_queues:
+            for queue in failed_queues:
+                queue.close()
             async with self._lock:
-                for failed_queue in failed_queues:
-                    if session_id in self.connections and failed_queue in self.connections[session_id]:
-                        self.connections[session_id].remove(failed_queue)
+                self._remove_queues(session_id, tuple(failed_queues))
 
 # 全局实例
 stream_manager = StreamManager()
\ No newline at end of file
@@ -0,0 +1,37 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# 禁止缓存的响应头，预先编码为 bytes，避免每个请求重复构造字符串
+NO_CACHE_HEADERS = [
+    (b"cache-control", b"no-cache, no-store, must-revalidate, max-age=0"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"0"),
+]
+_NO_CACHE_HEADER_NAMES = frozenset(name for name, _ in NO_CACHE_HEADERS)
+
+
+class NoCacheMiddleware:
+    """为指定前缀下的响应添加禁止缓存的头部
+
+    纯 ASGI 实现，直接检查 scope["path"]，不为每个请求构造 Request/URL 对象。
+    """
+
+    def __init__(self, app: ASGIApp, path_prefix: str = "/api/") -> None:
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_no_cache(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # 覆盖路由自行设置的同名头部（如 SSE 响应的 Cache-Control）
+                message["headers"] = [
+                    (name, value) for name, value in message.get("headers", ())
+                    if name.lower() not in _NO_CACHE_HEADER_NAMES
+                ] + NO_CACHE_HEADERS
+            await send(message)
+
+        await self.app(scope, receive, send_with_no_cache)
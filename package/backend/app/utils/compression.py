@@ -0,0 +1,47 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+
+# 这些类型本身已压缩或需要实时推送，再做 gzip 只会浪费 CPU（或缓冲住 SSE 事件）
+UNCOMPRESSIBLE_CONTENT_TYPES = (
+    "image/",
+    "font/",
+    "audio/",
+    "video/",
+    "application/octet-stream",
+    "application/zip",
+    "application/pdf",
+    "application/vnd.openxmlformats",
+    "text/event-stream",
+)
+
+
+class _SelectiveGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith(UNCOMPRESSIBLE_CONTENT_TYPES):
+                # 复用父类"已设置 Content-Encoding"的直通逻辑
+                self.initial_message = message
+                self.content_encoding_set = True
+                return
+        await super().send_with_gzip(message)
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """只压缩可压缩的响应（JSON、HTML、JS 等）
+
+    已压缩的资源（图片、字体、docx 等）、事件流以及已设置 Content-Encoding 的响应原样返回。
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            if "gzip" in headers.get("Accept-Encoding", ""):
+                responder = _SelectiveGZipResponder(
+                    self.app, self.minimum_size, compresslevel=self.compresslevel
+                )
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
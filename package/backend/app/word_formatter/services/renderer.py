@@ -3,11 +3,13 @@
 """
 from __future__ import annotations
 
+import copy
 import io
 import os
 import re
-from dataclasses import dataclass
-from typing import Optional, Set
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, FrozenSet, Optional, Tuple
 
 from docx import Document
 from docx.enum.section import WD_SECTION
@@ -15,6 +17,7 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from docx.shared import Mm
+from docx.text.paragraph import Paragraph
 
 from ..models.ast import (
     BibliographyBlock,
@@ -22,7 +25,6 @@ from ..models.ast import (
     DocumentAST,
     FigureBlock,
     HeadingBlock,
-    Inline,
     ListBlock,
     ParagraphBlock,
     PageBreakBlock,
@@ -32,22 +34,26 @@ from ..models.ast import (
 from ..models.stylespec import StyleSpec
 
 
+_ALIGN_MAP = {
+    "left": WD_ALIGN_PARAGRAPH.LEFT,
+    "center": WD_ALIGN_PARAGRAPH.CENTER,
+    "right": WD_ALIGN_PARAGRAPH.RIGHT,
+    "justify": WD_ALIGN_PARAGRAPH.JUSTIFY,
+}
+
+
 def _align_to_docx(align: str):
-    return {
-        "left": WD_ALIGN_PARAGRAPH.LEFT,
-        "center": WD_ALIGN_PARAGRAPH.CENTER,
-        "right": WD_ALIGN_PARAGRAPH.RIGHT,
-        "justify": WD_ALIGN_PARAGRAPH.JUSTIFY,
-    }[align]
+    return _ALIGN_MAP[align]
 
 
 def _clear_paragraph_runs(p) -> None:
     """清除段落中的所有 runs。"""
-    for r in list(p.runs):
-        try:
-            p._p.remove(r._r)
-        except Exception:
-            pass
+    p_elem = p._p
+    # 新建表格单元格中的段落没有 run，直接返回
+    if p_elem.find(qn("w:r")) is None:
+        return
+    for r in p_elem.findall(qn("w:r")):
+        p_elem.remove(r)
 
 
 def _clear_paragraph_numbering(p) -> None:
@@ -80,25 +86,30 @@ def _apply_inline_style(run, inline_type: str) -> None:
         run.font.name = "Consolas"
 
 
-def _apply_inlines(p, inlines: list) -> None:
+def _apply_inlines(p, inlines: list, prefix_text: Optional[str] = None) -> None:
     """
     将 Inline 列表渲染到段落中，保留富文本格式。
 
     Args:
         p: python-docx 段落对象
         inlines: Inline 对象列表
+        prefix_text: 可选的前缀纯文本（如“摘要：”），在所有 inline 之前输出
     """
+    add_run = p.add_run
+    if prefix_text:
+        add_run(prefix_text)
     for inline in inlines:
         text = inline.text or ""
+        if "\n" not in text:
+            if text:
+                _apply_inline_style(add_run(text), inline.type)
+            continue
         # 处理换行符
-        parts = text.split("\n")
-        for i, part in enumerate(parts):
+        for i, part in enumerate(text.split("\n")):
             if i > 0:
-                p.add_run().add_break()
-            if not part:
-                continue
-            run = p.add_run(part)
-            _apply_inline_style(run, inline.type)
+                add_run().add_break()
+            if part:
+                _apply_inline_style(add_run(part), inline.type)
 
 
 @dataclass
@@ -109,40 +120,86 @@ class RenderOptions:
     toc_levels: int = 3
 
 
-_FRONT_HEADINGS: Set[str] = {
+# 条目均为小写形式，查找时只需比较 text.lower()
+_FRONT_HEADINGS: FrozenSet[str] = frozenset(s.lower() for s in (
     "摘要", "关键词", "关键字", "abstract", "key words", "keywords",
     "致谢", "谢辞", "参考文献", "references", "目录", "目 录",
-}
+))
 
-_FRONT_ONLY_HEADINGS: Set[str] = {
+_FRONT_ONLY_HEADINGS: FrozenSet[str] = frozenset(s.lower() for s in (
     "摘要", "关键词", "关键字", "abstract", "key words", "keywords",
+))
+
+
+_TABLE_NUM_RE = re.compile(r"^表\d+")
+_FIG_NUM_RE = re.compile(r"^图\d+")
+_CN_KW_SPLIT_RE = re.compile(r"[，,;；\s]+")
+_EN_KW_SPLIT_RE = re.compile(r"[;；,，]+")
+
+# 页脚页码 run（含 PAGE 域），每节复制一份
+_PAGE_FIELD_RUN = OxmlElement("w:r")
+_PAGE_FIELD_RUN.append(OxmlElement("w:fldSimple", {qn("w:instr"): "PAGE"}))
+
+# 章节 -> 段落样式，未列出的章节使用 Body
+_SECTION_BODY_STYLES: Dict[str, str] = {
+    "cn_abstract": "AbstractBody",
+    "en_abstract": "AbstractBody",
+    "cn_keywords": "KeywordsBody",
+    "en_keywords": "KeywordsBody",
+    "references": "Reference",
 }
 
+# 渲染过程中会用到的样式名
+_STYLE_NAMES = (
+    "Body", "H1", "H2", "H3", "FrontHeading", "AbstractBody", "KeywordsBody",
+    "Reference", "ListNumber", "ListBullet", "TableTitle", "TableText",
+    "CodeBlock", "FigureCaption", "PageNumber", "TitleCN", "TitleEN", "MetaLine",
+)
+
+
+def _resolve_styles(doc: Document) -> Dict[str, Any]:
+    """一次性解析模板中存在的样式，避免在渲染循环中反复查找 doc.styles。"""
+    return {name: doc.styles[name] for name in _STYLE_NAMES if name in doc.styles}
+
 
 def _is_front_heading(text: str) -> bool:
     """检查是否为前置标题（不区分大小写）。"""
-    return text.lower() in _FRONT_HEADINGS or text in _FRONT_HEADINGS
+    return text.lower() in _FRONT_HEADINGS
 
 
 def _is_front_only_heading(text: str) -> bool:
     """检查是否为仅前置标题（不区分大小写）。"""
-    return text.lower() in _FRONT_ONLY_HEADINGS or text in _FRONT_ONLY_HEADINGS
+    return text.lower() in _FRONT_ONLY_HEADINGS
 
 
-def _apply_page_numbering_ooxml(docx_bytes: bytes, spec: StyleSpec) -> bytes:
-    """Set section-based page numbering format/start using OOXML."""
-    pn = spec.page_numbering
-    if not pn or not pn.enabled:
-        return docx_bytes
-    from ..utils.ooxml import DocxPackage
-    from lxml import etree
+@lru_cache(maxsize=1024)
+def _classify_heading(heading_text: str) -> Tuple[str, bool, bool]:
+    """对（已去除首尾空白的）标题文本分类。
+
+    Returns:
+        (所属章节, 是否前置标题, 是否仅前置标题)；同一标题在预览和正式渲染中会重复出现，结果按文本缓存
+    """
+    lower = heading_text.lower()
+    if heading_text == "摘要":
+        section = "cn_abstract"
+    elif heading_text in {"关键词", "关键字"}:
+        section = "cn_keywords"
+    elif lower == "abstract":
+        section = "en_abstract"
+    elif lower in {"key words", "keywords"}:
+        section = "en_keywords"
+    elif lower in {"参考文献", "references"}:
+        section = "references"
+    else:
+        section = "body"
+    return section, _is_front_heading(heading_text), _is_front_only_heading(heading_text)
 
-    W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
-    NSMAP = {"w": W_NS}
 
-    def _qn(tag: str) -> str:
-        pref, local = tag.split(":")
-        return f"{{{NSMAP[pref]}}}{local}"
+def _apply_page_numbering_inplace(doc: Document, spec: StyleSpec) -> None:
+    """直接在内存中的文档上设置分节页码格式/起始值，保存前调用即可，无需再解压重打包。"""
+    pn = spec.page_numbering
+    if not pn or not pn.enabled:
+        return
 
     fmt_map = {
         "decimal": "decimal",
@@ -150,30 +207,18 @@ def _apply_page_numbering_ooxml(docx_bytes: bytes, spec: StyleSpec) -> bytes:
         "romanLower": "lowerRoman",
     }
 
-    pkg = DocxPackage.from_bytes(docx_bytes)
-    root = pkg.read_xml("word/document.xml")
-    body = root.find("w:body", namespaces=NSMAP)
-    if body is None:
-        return docx_bytes
-
-    sect_prs = body.findall(".//w:sectPr", namespaces=NSMAP)
-    seen = set()
-    ordered = []
-    for s in sect_prs:
-        sid = id(s)
-        if sid in seen:
-            continue
-        seen.add(sid)
-        ordered.append(s)
+    # sectPr 只会出现在 body 末尾或段落的 pPr 中，按文档顺序只查这两处
+    ordered = doc.element.body.xpath("./w:p/w:pPr/w:sectPr | ./w:sectPr")
     if not ordered:
-        return docx_bytes
+        return
 
     def _set_pgnum(sectPr, fmt: str, start: int):
-        pg = sectPr.find("w:pgNumType", namespaces=NSMAP)
+        pg = sectPr.find(qn("w:pgNumType"))
         if pg is None:
-            pg = etree.SubElement(sectPr, _qn("w:pgNumType"))
-        pg.set(_qn("w:fmt"), fmt_map.get(fmt, "decimal"))
-        pg.set(_qn("w:start"), str(int(start)))
+            pg = OxmlElement("w:pgNumType")
+            sectPr.append(pg)
+        pg.set(qn("w:fmt"), fmt_map.get(fmt, "decimal"))
+        pg.set(qn("w:start"), str(int(start)))
 
     if len(ordered) == 1:
         _set_pgnum(ordered[0], pn.main_format, pn.main_start)
@@ -181,21 +226,16 @@ def _apply_page_numbering_ooxml(docx_bytes: bytes, spec: StyleSpec) -> bytes:
         _set_pgnum(ordered[0], pn.front_format, pn.front_start)
         _set_pgnum(ordered[-1], pn.main_format, pn.main_start)
 
-    pkg.write_xml("word/document.xml", root)
-    return pkg.to_bytes()
 
-
-def _insert_toc_paragraph(doc: Document, title: str, front_style: str, max_level: int):
+def _insert_toc_paragraph(doc: Document, styles: Dict[str, Any], title: str, front_style: str, max_level: int):
     doc.add_paragraph("")
     doc.add_paragraph("")
     p = doc.add_paragraph(title)
-    if front_style in doc.styles:
-        p.style = doc.styles[front_style]
+    if front_style in styles:
+        p.style = styles[front_style]
     p2 = doc.add_paragraph()
     run = p2.add_run()
-    fld = OxmlElement("w:fldSimple")
-    fld.set(qn("w:instr"), f'TOC \\o "1-{max_level}" \\h \\z \\u')
-    run._r.append(fld)
+    run._r.append(OxmlElement("w:fldSimple", {qn("w:instr"): f'TOC \\o "1-{max_level}" \\h \\z \\u'}))
     run2 = p2.add_run("（在 Word 中右键目录 → 更新域）")
 
 
@@ -211,15 +251,16 @@ def _detect_heading_level_offset(ast: DocumentAST) -> int:
     Returns:
         偏移量（0 表示无需调整，1 表示所有级别减 1，以此类推）
     """
-    min_level = None
-    for block in ast.blocks:
-        if isinstance(block, HeadingBlock):
-            # 跳过前置标题（摘要、Abstract 等通常是单独设置的）
-            heading_text = block.text.strip().lower()
-            if heading_text in _FRONT_HEADINGS:
-                continue
-            if min_level is None or block.level < min_level:
-                min_level = block.level
+    # 跳过前置标题（摘要、Abstract 等通常是单独设置的）
+    min_level = min(
+        (
+            block.level
+            for block in ast.blocks
+            if isinstance(block, HeadingBlock)
+            and not _classify_heading(block.text.strip())[1]
+        ),
+        default=None,
+    )
 
     # 如果没有正文标题或最小级别已是 1，无需调整
     if min_level is None or min_level <= 1:
@@ -228,14 +269,262 @@ def _detect_heading_level_offset(ast: DocumentAST) -> int:
     return min_level - 1
 
 
+@dataclass
+class _RenderState:
+    """一次渲染过程中各块处理函数共享的上下文与可变状态。"""
+    doc: Any
+    spec: StyleSpec
+    styles: Dict[str, Any]
+    need_page_numbering: bool
+    heading_level_offset: int
+    main_section_inserted: bool = False
+    current_section: Optional[str] = None
+    abstract_prefixed: bool = False
+    keywords_prefixed: bool = False
+    fig_counter: int = 0
+    table_counter: int = 0
+    # 本次渲染中图片路径是否存在的缓存，同一图片多次引用时只检查一次
+    figure_exists: Dict[str, bool] = field(default_factory=dict)
+
+
+def _render_heading(state: _RenderState, block: HeadingBlock) -> None:
+    doc = state.doc
+    styles = state.styles
+    heading_text = block.text.strip()
+    state.current_section, is_front, is_front_only = _classify_heading(heading_text)
+
+    if (
+        state.need_page_numbering
+        and not state.main_section_inserted
+        and not is_front_only
+        and len(doc.paragraphs) > 0
+    ):
+        doc.add_section(WD_SECTION.NEW_PAGE)
+        state.main_section_inserted = True
+
+    if is_front:
+        style_id = "FrontHeading"
+        display_text = heading_text
+    else:
+        # 应用级别偏移（支持 ## 作为一级标题等情况）
+        effective_level = max(1, block.level - state.heading_level_offset)
+
+        # 限制最大层级为 3（模板通常只支持 H1-H3）
+        effective_level = min(effective_level, 3)
+
+        if effective_level == 1:
+            style_id = "H1"
+        elif effective_level == 2:
+            style_id = "H2"
+        elif effective_level == 3:
+            style_id = "H3"
+        else:
+            style_id = "H3"
+
+        # 直接使用原始标题文本，不添加编号
+        display_text = heading_text
+
+    p = doc.add_paragraph(display_text)
+    if style_id in styles:
+        p.style = styles[style_id]
+    elif "Body" in styles:
+        p.style = styles["Body"]
+    # 清除 Word 样式可能关联的自动编号
+    _clear_paragraph_numbering(p)
+
+
+def _render_paragraph(state: _RenderState, block: ParagraphBlock) -> None:
+    inlines = block.inlines
+    raw_text = block.text
+    if raw_text is None and inlines:
+        raw_text = "".join(i.text for i in inlines)
+    raw_text = raw_text or ""
+    if not raw_text.strip():
+        return
+
+    current_section = state.current_section
+    prefix_text = None
+    # 处理摘要/关键词前缀（正文段落直接跳过）
+    if state.spec.auto_prefix_abstract_keywords and current_section != "body":
+        if current_section == "cn_abstract" and not state.abstract_prefixed:
+            if not raw_text.startswith("摘要："):
+                if inlines:
+                    prefix_text = "摘要："
+                else:
+                    raw_text = "摘要：" + raw_text
+            state.abstract_prefixed = True
+        elif current_section == "en_abstract" and not state.abstract_prefixed:
+            if not raw_text.lower().startswith("abstract:"):
+                if inlines:
+                    prefix_text = "Abstract: "
+                else:
+                    raw_text = "Abstract: " + raw_text
+            state.abstract_prefixed = True
+        elif current_section == "cn_keywords" and not state.keywords_prefixed:
+            if not raw_text.startswith(("关键词：", "关键字：")):
+                if inlines:
+                    prefix_text = "关键词："
+                else:
+                    raw_text = "关键词：" + _normalize_cn_keywords(raw_text)
+            state.keywords_prefixed = True
+        elif current_section == "en_keywords" and not state.keywords_prefixed:
+            if not raw_text.lower().startswith(("key words:", "keywords:")):
+                if inlines:
+                    prefix_text = "Key words: "
+                else:
+                    raw_text = "Key words: " + _normalize_en_keywords(raw_text)
+            state.keywords_prefixed = True
+
+    p = state.doc.add_paragraph()
+    style = state.styles.get(_SECTION_BODY_STYLES.get(current_section, "Body"))
+    if style is not None:
+        p.style = style
+    # 优先使用富文本渲染
+    if inlines:
+        _apply_inlines(p, inlines, prefix_text)
+    else:
+        p.add_run(raw_text)
+
+
+def _render_list(state: _RenderState, block: ListBlock) -> None:
+    doc = state.doc
+    styles = state.styles
+    style_name = "ListNumber" if block.ordered else "ListBullet"
+    list_style = styles.get(style_name)
+    for idx, item in enumerate(block.items, start=1):
+        if not any((i.text or "").strip() for i in item.inlines):
+            continue
+        if list_style is not None:
+            p = doc.add_paragraph()
+            p.style = list_style
+            _apply_inlines(p, item.inlines)
+        else:
+            prefix = f"{idx}. " if block.ordered else "• "
+            p = doc.add_paragraph()
+            if "Body" in styles:
+                p.style = styles["Body"]
+            p.add_run(prefix)
+            _apply_inlines(p, item.inlines)
+
+
+def _render_table(state: _RenderState, block: TableBlock) -> None:
+    doc = state.doc
+    styles = state.styles
+    auto_number = state.spec.auto_number_figures_tables
+    if block.caption:
+        caption = block.caption.strip()
+        if auto_number and not _TABLE_NUM_RE.match(caption):
+            state.table_counter += 1
+            caption = f"表{state.table_counter} {caption}"
+        pcap = doc.add_paragraph(caption)
+        if "TableTitle" in styles:
+            pcap.style = styles["TableTitle"]
+    elif auto_number:
+        state.table_counter += 1
+        pcap = doc.add_paragraph(f"表{state.table_counter}")
+        if "TableTitle" in styles:
+            pcap.style = styles["TableTitle"]
+    if not block.rows:
+        return
+    # 使用富文本列或纯文本列来计算列数
+    rows_for_cols = block.rows_inlines if block.rows_inlines else block.rows
+    cols = max(len(r) for r in rows_for_cols)
+    table = doc.add_table(rows=len(block.rows), cols=cols)
+    _fill_table_cells(table, block, styles.get("TableText"))
+    _apply_three_line_table(table)
+
+
+def _render_code(state: _RenderState, block: CodeBlock) -> None:
+    doc = state.doc
+    styles = state.styles
+    p = doc.add_paragraph()
+    if "CodeBlock" in styles:
+        p.style = styles["CodeBlock"]
+    elif "Body" in styles:
+        p.style = styles["Body"]
+
+    # 特殊处理 Mermaid 流程图
+    if block.language and block.language.lower() == "mermaid":
+        placeholder_run = p.add_run("[流程图占位：mermaid]")
+        placeholder_run.italic = True
+        # 添加代码内容作为参考
+        p2 = doc.add_paragraph()
+        if "CodeBlock" in styles:
+            p2.style = styles["CodeBlock"]
+        code_run = p2.add_run(block.text or "")
+        code_run.font.name = "Consolas"
+    else:
+        # 普通代码块
+        code_run = p.add_run(block.text or "")
+        code_run.font.name = "Consolas"
+
+
+def _render_figure(state: _RenderState, block: FigureBlock) -> None:
+    doc = state.doc
+    styles = state.styles
+    caption = block.caption
+    if state.spec.auto_number_figures_tables and caption:
+        stripped_caption = caption.strip()
+        if not _FIG_NUM_RE.match(stripped_caption):
+            state.fig_counter += 1
+            caption = f"图{state.fig_counter} {stripped_caption}"
+    exists = state.figure_exists.get(block.path)
+    if exists is None:
+        exists = state.figure_exists[block.path] = os.path.exists(block.path)
+    if exists:
+        doc.add_picture(block.path)
+    else:
+        p = doc.add_paragraph(f"[图片占位：{block.path}]")
+        if "Body" in styles:
+            p.style = styles["Body"]
+    if caption:
+        pcap = doc.add_paragraph(caption)
+        if "FigureCaption" in styles:
+            pcap.style = styles["FigureCaption"]
+
+
+def _render_page_break(state: _RenderState, block: PageBreakBlock) -> None:
+    state.doc.add_page_break()
+
+
+def _render_section_break(state: _RenderState, block: SectionBreakBlock) -> None:
+    state.doc.add_section(WD_SECTION.NEW_PAGE)
+
+
+def _render_bibliography(state: _RenderState, block: BibliographyBlock) -> None:
+    ref_style = state.styles.get("Reference")
+    _append_plain_paragraphs(state.doc, block.items, ref_style.style_id if ref_style is not None else None)
+
+
+# 块类型 -> 渲染函数
+_BLOCK_RENDERERS: Dict[type, Callable[[_RenderState, Any], None]] = {
+    HeadingBlock: _render_heading,
+    ParagraphBlock: _render_paragraph,
+    ListBlock: _render_list,
+    TableBlock: _render_table,
+    CodeBlock: _render_code,
+    FigureBlock: _render_figure,
+    PageBreakBlock: _render_page_break,
+    SectionBreakBlock: _render_section_break,
+    BibliographyBlock: _render_bibliography,
+}
+
+
 def render_docx(
     ast: DocumentAST,
     spec: StyleSpec,
     reference_docx_bytes: bytes,
     options: Optional[RenderOptions] = None,
-) -> bytes:
+    out_stream: Optional[BinaryIO] = None,
+) -> Optional[bytes]:
+    """渲染文档。
+
+    传入 out_stream 时直接把 .docx 写入该流并返回 None，避免再复制一份字节；
+    否则返回 .docx 字节。
+    """
     options = options or RenderOptions()
     doc = Document(io.BytesIO(reference_docx_bytes))
+    styles = _resolve_styles(doc)
 
     section = doc.sections[0]
     section.top_margin = Mm(spec.page.margins_mm.top)
@@ -253,277 +542,59 @@ def render_docx(
 
     # Cover
     if options.include_cover:
-        _render_cover(doc, ast)
+        _render_cover(doc, styles, ast)
         doc.add_page_break()
 
     # TOC
     if options.include_toc:
-        _insert_toc_paragraph(doc, options.toc_title, "FrontHeading", spec.structure.toc_max_level)
+        _insert_toc_paragraph(doc, styles, options.toc_title, "FrontHeading", spec.structure.toc_max_level)
         doc.add_page_break()
 
-    need_page_numbering = bool(spec.page_numbering and spec.page_numbering.enabled)
-    main_section_inserted = False
-
-    current_section = None
-    abstract_prefixed = False
-    keywords_prefixed = False
-    fig_counter = 0
-    table_counter = 0
-
-    # 检测标题级别偏移（支持 ## 作为一级标题等情况）
-    heading_level_offset = _detect_heading_level_offset(ast)
+    state = _RenderState(
+        doc=doc,
+        spec=spec,
+        styles=styles,
+        need_page_numbering=bool(spec.page_numbering and spec.page_numbering.enabled),
+        # 检测标题级别偏移（支持 ## 作为一级标题等情况）
+        heading_level_offset=_detect_heading_level_offset(ast),
+    )
 
     for block in ast.blocks:
-        if isinstance(block, HeadingBlock):
-            heading_text = block.text.strip()
-
-            if heading_text in {"摘要"}:
-                current_section = "cn_abstract"
-            elif heading_text in {"关键词", "关键字"}:
-                current_section = "cn_keywords"
-            elif heading_text.lower() == "abstract":
-                current_section = "en_abstract"
-            elif heading_text.lower() in {"key words", "keywords"}:
-                current_section = "en_keywords"
-            elif heading_text.lower() in {"参考文献", "references"}:
-                current_section = "references"
-            else:
-                current_section = "body"
-
-            if (
-                need_page_numbering
-                and not main_section_inserted
-                and not _is_front_only_heading(heading_text)
-                and len(doc.paragraphs) > 0
-            ):
-                doc.add_section(WD_SECTION.NEW_PAGE)
-                main_section_inserted = True
-
-            if _is_front_heading(heading_text):
-                style_id = "FrontHeading"
-                display_text = heading_text
-            else:
-                # 应用级别偏移（支持 ## 作为一级标题等情况）
-                effective_level = max(1, block.level - heading_level_offset)
-
-                # 限制最大层级为 3（模板通常只支持 H1-H3）
-                effective_level = min(effective_level, 3)
-
-                if effective_level == 1:
-                    style_id = "H1"
-                elif effective_level == 2:
-                    style_id = "H2"
-                elif effective_level == 3:
-                    style_id = "H3"
-                else:
-                    style_id = "H3"
-
-                # 直接使用原始标题文本，不添加编号
-                display_text = heading_text
-
-            p = doc.add_paragraph(display_text)
-            if style_id in doc.styles:
-                p.style = doc.styles[style_id]
-            elif "Body" in doc.styles:
-                p.style = doc.styles["Body"]
-            # 清除 Word 样式可能关联的自动编号
-            _clear_paragraph_numbering(p)
-            continue
-
-        if isinstance(block, ParagraphBlock):
-            inlines = block.inlines
-            raw_text = block.text
-            if raw_text is None and inlines:
-                raw_text = "".join(i.text for i in inlines)
-            if not (raw_text or "").strip():
-                continue
-
-            # 处理摘要/关键词前缀
-            if spec.auto_prefix_abstract_keywords:
-                if current_section == "cn_abstract" and not abstract_prefixed:
-                    if not (raw_text or "").startswith("摘要："):
-                        if inlines:
-                            inlines = [Inline(type="text", text="摘要：")] + list(inlines)
-                        else:
-                            raw_text = "摘要：" + (raw_text or "")
-                    abstract_prefixed = True
-                elif current_section == "en_abstract" and not abstract_prefixed:
-                    if not (raw_text or "").lower().startswith("abstract:"):
-                        if inlines:
-                            inlines = [Inline(type="text", text="Abstract: ")] + list(inlines)
-                        else:
-                            raw_text = "Abstract: " + (raw_text or "")
-                    abstract_prefixed = True
-                elif current_section in {"cn_keywords", "en_keywords"} and not keywords_prefixed:
-                    if current_section == "cn_keywords" and not (raw_text or "").startswith(("关键词：", "关键字：")):
-                        if inlines:
-                            inlines = [Inline(type="text", text="关键词：")] + list(inlines)
-                        else:
-                            raw_text = "关键词：" + _normalize_cn_keywords(raw_text or "")
-                    elif current_section == "en_keywords" and not (raw_text or "").lower().startswith(("key words:", "keywords:")):
-                        if inlines:
-                            inlines = [Inline(type="text", text="Key words: ")] + list(inlines)
-                        else:
-                            raw_text = "Key words: " + _normalize_en_keywords(raw_text or "")
-                    keywords_prefixed = True
-
-            style_id = "Body"
-            if current_section in {"cn_abstract", "en_abstract"}:
-                style_id = "AbstractBody"
-            elif current_section in {"cn_keywords", "en_keywords"}:
-                style_id = "KeywordsBody"
-            elif current_section == "references":
-                style_id = "Reference"
-
-            p = doc.add_paragraph()
-            if style_id in doc.styles:
-                p.style = doc.styles[style_id]
-            # 优先使用富文本渲染
-            if inlines:
-                _apply_inlines(p, inlines)
-            else:
-                p.add_run(raw_text or "")
-            continue
-
-        if isinstance(block, ListBlock):
-            style_name = "ListNumber" if block.ordered else "ListBullet"
-            use_style = style_name in doc.styles
-            for idx, item in enumerate(block.items, start=1):
-                raw_text = "".join(i.text for i in item.inlines)
-                if not raw_text.strip():
-                    continue
-                if use_style:
-                    p = doc.add_paragraph()
-                    p.style = doc.styles[style_name]
-                    _apply_inlines(p, item.inlines)
-                else:
-                    prefix = f"{idx}. " if block.ordered else "• "
-                    p = doc.add_paragraph()
-                    if "Body" in doc.styles:
-                        p.style = doc.styles["Body"]
-                    p.add_run(prefix)
-                    _apply_inlines(p, item.inlines)
-            continue
-
-        if isinstance(block, TableBlock):
-            if block.caption:
-                caption = block.caption.strip()
-                if spec.auto_number_figures_tables and not re.match(r"^表\d+", caption):
-                    table_counter += 1
-                    caption = f"表{table_counter} {caption}"
-                pcap = doc.add_paragraph(caption)
-                if "TableTitle" in doc.styles:
-                    pcap.style = doc.styles["TableTitle"]
-            elif spec.auto_number_figures_tables:
-                table_counter += 1
-                pcap = doc.add_paragraph(f"表{table_counter}")
-                if "TableTitle" in doc.styles:
-                    pcap.style = doc.styles["TableTitle"]
-            if not block.rows:
-                continue
-            # 使用富文本列或纯文本列来计算列数
-            rows_for_cols = block.rows_inlines if block.rows_inlines else block.rows
-            cols = max(len(r) for r in rows_for_cols)
-            table = doc.add_table(rows=len(block.rows), cols=cols)
-            for r_i, row in enumerate(block.rows):
-                for c_i in range(cols):
-                    cell = table.cell(r_i, c_i)
-                    # 优先使用富文本渲染
-                    cell_inlines = None
-                    if block.rows_inlines and r_i < len(block.rows_inlines):
-                        if c_i < len(block.rows_inlines[r_i]):
-                            cell_inlines = block.rows_inlines[r_i][c_i]
-                    cell_text = row[c_i] if c_i < len(row) else ""
-                    p = cell.paragraphs[0] if cell.paragraphs else cell.add_paragraph()
-                    _clear_paragraph_runs(p)
-                    if cell_inlines:
-                        _apply_inlines(p, cell_inlines)
-                    else:
-                        p.add_run(cell_text)
-                    if "TableText" in doc.styles:
-                        p.style = doc.styles["TableText"]
-                    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            _apply_three_line_table(table)
-            continue
-
-        if isinstance(block, CodeBlock):
-            # 处理代码块
-            p = doc.add_paragraph()
-            if "CodeBlock" in doc.styles:
-                p.style = doc.styles["CodeBlock"]
-            elif "Body" in doc.styles:
-                p.style = doc.styles["Body"]
-
-            # 特殊处理 Mermaid 流程图
-            if block.language and block.language.lower() == "mermaid":
-                placeholder_run = p.add_run("[流程图占位：mermaid]")
-                placeholder_run.italic = True
-                # 添加代码内容作为参考
-                p2 = doc.add_paragraph()
-                if "CodeBlock" in doc.styles:
-                    p2.style = doc.styles["CodeBlock"]
-                code_run = p2.add_run(block.text or "")
-                code_run.font.name = "Consolas"
-            else:
-                # 普通代码块
-                code_run = p.add_run(block.text or "")
-                code_run.font.name = "Consolas"
-            continue
-
-        if isinstance(block, FigureBlock):
-            if spec.auto_number_figures_tables and block.caption and not re.match(r"^图\d+", block.caption.strip()):
-                fig_counter += 1
-                caption = f"图{fig_counter} {block.caption.strip()}"
-            else:
-                caption = block.caption
-            if os.path.exists(block.path):
-                doc.add_picture(block.path)
-            else:
-                p = doc.add_paragraph(f"[图片占位：{block.path}]")
-                if "Body" in doc.styles:
-                    p.style = doc.styles["Body"]
-            if caption:
-                pcap = doc.add_paragraph(caption)
-                if "FigureCaption" in doc.styles:
-                    pcap.style = doc.styles["FigureCaption"]
-            continue
-
-        if isinstance(block, PageBreakBlock):
-            doc.add_page_break()
-            continue
-
-        if isinstance(block, SectionBreakBlock):
-            doc.add_section(WD_SECTION.NEW_PAGE)
-            continue
-
-        if isinstance(block, BibliographyBlock):
-            for it in block.items:
-                p = doc.add_paragraph(it)
-                if "Reference" in doc.styles:
-                    p.style = doc.styles["Reference"]
-            continue
-
+        handler = _BLOCK_RENDERERS.get(type(block))
+        if handler is not None:
+            handler(state, block)
+
+    if state.need_page_numbering:
+        _ensure_footer_page_numbers(doc, styles, spec)
+        _apply_page_numbering_inplace(doc, spec)
+    if out_stream is not None:
+        doc.save(out_stream)
+        return None
     out = io.BytesIO()
     doc.save(out)
-    data = out.getvalue()
-    if need_page_numbering:
-        _ensure_footer_page_numbers(doc, spec)
-        out = io.BytesIO()
-        doc.save(out)
-        data = out.getvalue()
-        data = _apply_page_numbering_ooxml(data, spec)
-    return data
+    return out.getvalue()
 
 
-def _render_cover(doc: Document, ast: DocumentAST) -> None:
+def _append_plain_paragraphs(doc: Document, texts, style_id: Optional[str]) -> None:
+    """直接在 body 上批量追加纯文本段落，等价于逐条 doc.add_paragraph(text) 后设置样式。"""
+    body = doc.element.body
+    for text in texts:
+        p = body.add_p()
+        if style_id is not None:
+            p.get_or_add_pPr().style = style_id
+        if text:
+            p.add_r().text = text
+
+
+def _render_cover(doc: Document, styles: Dict[str, Any], ast: DocumentAST) -> None:
     if ast.meta.title_cn:
         p = doc.add_paragraph(ast.meta.title_cn)
-        if "TitleCN" in doc.styles:
-            p.style = doc.styles["TitleCN"]
+        if "TitleCN" in styles:
+            p.style = styles["TitleCN"]
     if ast.meta.title_en:
         p = doc.add_paragraph(ast.meta.title_en)
-        if "TitleEN" in doc.styles:
-            p.style = doc.styles["TitleEN"]
+        if "TitleEN" in styles:
+            p.style = styles["TitleEN"]
 
     meta_parts = []
     if ast.meta.major:
@@ -534,63 +605,97 @@ def _render_cover(doc: Document, ast: DocumentAST) -> None:
         meta_parts.append(f"指导教师：{ast.meta.tutor}")
     for line in meta_parts:
         p = doc.add_paragraph(line)
-        if "MetaLine" in doc.styles:
-            p.style = doc.styles["MetaLine"]
+        if "MetaLine" in styles:
+            p.style = styles["MetaLine"]
 
 
-def _ensure_footer_page_numbers(doc: Document, spec: StyleSpec) -> None:
+def _ensure_footer_page_numbers(doc: Document, styles: Dict[str, Any], spec: StyleSpec) -> None:
     pn = spec.page_numbering
     if not pn or not pn.enabled or not pn.show_in_footer:
         return
 
+    page_number_style = styles.get("PageNumber")
+    alignment = _align_to_docx(pn.footer_alignment)
     for section in doc.sections:
         footer = section.footer
         p = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
-        for r in list(p.runs):
-            try:
-                p._p.remove(r._r)
-            except Exception:
-                pass
-        if "PageNumber" in doc.styles:
-            p.style = doc.styles["PageNumber"]
-        p.alignment = _align_to_docx(pn.footer_alignment)
-        run = p.add_run()
-        fld = OxmlElement("w:fldSimple")
-        fld.set(qn("w:instr"), "PAGE")
-        run._r.append(fld)
+        _clear_paragraph_runs(p)
+        if page_number_style is not None:
+            p.style = page_number_style
+        p.alignment = alignment
+        p._p.append(copy.deepcopy(_PAGE_FIELD_RUN))
 
 
 def _normalize_cn_keywords(txt: str) -> str:
-    parts = [p for p in re.split(r"[，,;；\s]+", txt) if p]
+    parts = [p for p in _CN_KW_SPLIT_RE.split(txt) if p]
     return "　".join(parts)
 
 
 def _normalize_en_keywords(txt: str) -> str:
-    parts = [p.strip() for p in re.split(r"[;；,，]+", txt) if p.strip()]
+    parts = [p.strip() for p in _EN_KW_SPLIT_RE.split(txt) if p.strip()]
     return "; ".join(parts)
 
 
+def _fill_table_cells(table, block: TableBlock, cell_style) -> None:
+    """直接在 XML 层填充新建表格的单元格。
+
+    逐个调用 table.cell() 每次都会重建整张表的单元格列表，
+    这里按行遍历 w:tr/w:tc，并为每个单元格段落复制同一份 pPr（样式 + 居中）。
+    """
+    pPr_template = OxmlElement("w:pPr")
+    if cell_style is not None:
+        pStyle = OxmlElement("w:pStyle")
+        pStyle.set(qn("w:val"), cell_style.style_id)
+        pPr_template.append(pStyle)
+    jc = OxmlElement("w:jc")
+    jc.set(qn("w:val"), "center")
+    pPr_template.append(jc)
+
+    rows_inlines = block.rows_inlines
+    for r_i, (tr, row) in enumerate(zip(table._tbl.tr_lst, block.rows)):
+        row_inlines = rows_inlines[r_i] if rows_inlines and r_i < len(rows_inlines) else None
+        for c_i, tc in enumerate(tr.tc_lst):
+            p_elem = tc.p_lst[0] if tc.p_lst else tc.add_p()
+            p_elem.insert(0, copy.deepcopy(pPr_template))
+            # 优先使用富文本渲染
+            cell_inlines = row_inlines[c_i] if row_inlines and c_i < len(row_inlines) else None
+            if cell_inlines:
+                _apply_inlines(Paragraph(p_elem, table), cell_inlines)
+            else:
+                r = p_elem.add_r()
+                cell_text = row[c_i] if c_i < len(row) else ""
+                if cell_text:
+                    r.text = cell_text
+
+
+def _build_three_line_borders():
+    borders = OxmlElement("w:tblBorders")
+    for tag, val, sz in (
+        ("top", "single", 12),
+        ("bottom", "single", 12),
+        ("insideH", "single", 6),
+        ("left", "nil", 0),
+        ("right", "nil", 0),
+        ("insideV", "nil", 0),
+    ):
+        borders.append(OxmlElement(f"w:{tag}", {
+            qn("w:val"): val,
+            qn("w:sz"): str(sz),
+            qn("w:space"): "0",
+            qn("w:color"): "000000",
+        }))
+    return borders
+
+
+# 三线表边框，每张表复制一份
+_THREE_LINE_BORDERS = _build_three_line_borders()
+
+
 def _apply_three_line_table(table) -> None:
-    tbl = table._tbl
-    tblPr = tbl.tblPr
-    tblBorders = tblPr.find(qn("w:tblBorders"))
-    if tblBorders is None:
-        tblBorders = OxmlElement("w:tblBorders")
-        tblPr.append(tblBorders)
-
-    def _border(tag: str, val: str, sz: int):
-        el = tblBorders.find(qn(f"w:{tag}"))
-        if el is None:
-            el = OxmlElement(f"w:{tag}")
-            tblBorders.append(el)
-        el.set(qn("w:val"), val)
-        el.set(qn("w:sz"), str(sz))
-        el.set(qn("w:space"), "0")
-        el.set(qn("w:color"), "000000")
-
-    _border("top", "single", 12)
-    _border("bottom", "single", 12)
-    _border("insideH", "single", 6)
-    _border("left", "nil", 0)
-    _border("right", "nil", 0)
-    _border("insideV", "nil", 0)
+    tblPr = table._tbl.tblPr
+    borders = copy.deepcopy(_THREE_LINE_BORDERS)
+    existing = tblPr.find(qn("w:tblBorders"))
+    if existing is None:
+        tblPr.append(borders)
+    else:
+        tblPr.replace(existing, borders)
@@ -6,6 +6,7 @@
 
 import sys
 import os
+import argparse
 from pathlib import Path
 
 # 添加项目路径到 Python 路径
@@ -14,7 +15,7 @@ sys.path.insert(0, str(backend_dir))
 
 from app.database import init_db, engine, SessionLocal
 from app.models.models import User, OptimizationSession, CustomPrompt, SystemSetting
-from sqlalchemy import text, inspect
+from sqlalchemy import text, inspect, MetaData
 
 
 def check_database_connection():
@@ -67,16 +68,17 @@ def display_table_info():
     print("\n数据库表信息:")
     print("-" * 60)
     try:
-        inspector = inspect(engine)
-        tables = inspector.get_table_names()
+        # 一次性反射所有表结构，避免逐表查询列信息
+        metadata = MetaData()
+        metadata.reflect(bind=engine)
         
-        for table_name in sorted(tables):
-            columns = inspector.get_columns(table_name)
+        for table_name, table in sorted(metadata.tables.items()):
+            columns = list(table.columns)
             print(f"\n📊 {table_name} ({len(columns)} 列)")
             for col in columns[:5]:  # 只显示前5列
-                col_type = str(col['type'])
-                nullable = "NULL" if col['nullable'] else "NOT NULL"
-                print(f"   - {col['name']}: {col_type} {nullable}")
+                col_type = str(col.type)
+                nullable = "NULL" if col.nullable else "NOT NULL"
+                print(f"   - {col.name}: {col_type} {nullable}")
             if len(columns) > 5:
                 print(f"   ... 还有 {len(columns) - 5} 列")
     except Exception as e:
@@ -151,6 +153,10 @@ def test_crud_operations():
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="数据库初始化和健康检查")
+    parser.add_argument("--verbose", action="store_true", help="显示各表的列信息")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("数据库初始化和健康检查")
     print("=" * 60)
@@ -183,8 +189,9 @@ def main():
     if not check_tables():
         print("\n⚠ 警告: 某些表缺失")
     
-    # 4. 显示表信息
-    display_table_info()
+    # 4. 显示表信息（仅在 --verbose 时，常规启动检查跳过）
+    if args.verbose:
+        display_table_info()
     
     # 5. 检查数据完整性
     check_data_integrity()
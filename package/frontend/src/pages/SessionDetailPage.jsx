@@ -29,6 +29,15 @@ const SessionDetailPage = () => {
       // 数据加载完成后再建立 SSE 连接
       const streamUrl = optimizationAPI.getStreamUrl(sessionId);
       eventSource = new EventSource(streamUrl);
+      let reconnecting = false;
+
+      eventSource.onopen = () => {
+        // 重连成功后重新加载详情，补上断开期间错过的增量
+        if (reconnecting) {
+          reconnecting = false;
+          loadSessionDetail();
+        }
+      };
 
       eventSource.onmessage = (event) => {
         try {
@@ -44,6 +53,11 @@ const SessionDetailPage = () => {
       };
 
       eventSource.onerror = (error) => {
+        // 服务端结束了流（如消息积压导致连接被移除），浏览器会自动重连
+        if (eventSource.readyState === EventSource.CONNECTING) {
+          reconnecting = true;
+          return;
+        }
         console.error('SSE Error:', error);
         eventSource.close();
       };
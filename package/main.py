@@ -4,12 +4,14 @@ AI 学术写作助手 - 统一入口
 将前后端整合为一个可执行文件
 """
 
+import asyncio
+import json
 import os
+import re
 import sys
-import webbrowser
 import threading
-import time
-import signal
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from typing import Optional
 
 # 获取应用运行目录
@@ -44,22 +46,21 @@ backend_path = os.path.join(APP_DIR, 'backend') if not getattr(sys, 'frozen', Fa
 if backend_path not in sys.path:
     sys.path.insert(0, backend_path)
 
-from fastapi import FastAPI, Request, HTTPException, Response
+from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-import uvicorn
 
 # 导入后端应用组件
 from app.config import settings
-from app.database import init_db
+from app.utils.cache_control import NoCacheMiddleware
+from app.utils.compression import SelectiveGZipMiddleware
+from app.database import init_db, seed_default_prompts, warm_pool
 from app.routes import admin, prompts, optimization
 from app.word_formatter import router as word_formatter_router
 from app.word_formatter.services import get_job_manager
-from app.models.models import CustomPrompt
-from app.database import SessionLocal
-from app.services.ai_service import get_default_polish_prompt, get_default_enhance_prompt
+from app.services.ai_service import close_shared_http_client
 
 # 检查默认密钥（仅警告，不退出）
 if settings.SECRET_KEY == "your-secret-key-change-this-in-production":
@@ -79,38 +80,52 @@ if settings.ADMIN_PASSWORD == "admin123":
     print(f"请在 {ENV_FILE} 文件中设置强密码 (建议12位以上)")
     print("="*60 + "\n")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时初始化，关闭时清理资源"""
+    print(f"\n📁 应用目录: {APP_DIR}")
+    print(f"📁 配置文件: {ENV_FILE}")
+    print(f"📁 数据库文件: {DB_FILE}")
+    print(f"📁 静态文件目录: {STATIC_DIR}")
+    
+    # 初始化数据库并创建系统默认提示词；同步的 SQLAlchemy 操作放到线程中执行，不阻塞事件循环
+    await asyncio.to_thread(init_db)
+    # 预热连接池，首个请求无需再建立数据库连接
+    await asyncio.to_thread(warm_pool)
+    await asyncio.to_thread(seed_default_prompts)
+    
+    yield
+    
+    job_manager = get_job_manager()
+    await job_manager.shutdown()
+    # 关闭共享的 AI 请求连接池
+    await close_shared_http_client()
+
+
 # 创建 FastAPI 应用
 app = FastAPI(
     title="AI 论文润色增强系统",
     description="高质量论文润色与原创性学术表达增强",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 添加 Gzip 压缩中间件以减少响应体积
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1500, compresslevel=6)
 
 # CORS 配置
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=settings.allowed_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # 显式列出前端实际使用的方法和请求头，避免通配符匹配
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
 )
 
-# 添加中间件：为所有 API 响应添加禁止缓存的头部
-@app.middleware("http")
-async def add_no_cache_headers(request: Request, call_next):
-    """为 API 请求添加禁止缓存的响应头"""
-    response = await call_next(request)
-    
-    # 只对 API 路径添加禁止缓存头，静态资源可以缓存
-    if request.url.path.startswith('/api/'):
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate, max-age=0"
-        response.headers["Pragma"] = "no-cache"
-        response.headers["Expires"] = "0"
-    
-    return response
+# 添加中间件：为所有 API 响应添加禁止缓存的头部（静态资源可以缓存）
+app.add_middleware(NoCacheMiddleware, path_prefix="/api/")
 
 # 注册 API 路由（添加 /api 前缀，与 backend/app/main.py 保持一致）
 app.include_router(admin.router, prefix="/api")
@@ -119,63 +134,6 @@ app.include_router(optimization.router, prefix="/api")
 app.include_router(word_formatter_router, prefix="/api")
 
 
-@app.on_event("startup")
-async def startup_event():
-    """启动时初始化"""
-    print(f"\n📁 应用目录: {APP_DIR}")
-    print(f"📁 配置文件: {ENV_FILE}")
-    print(f"📁 数据库文件: {DB_FILE}")
-    print(f"📁 静态文件目录: {STATIC_DIR}")
-    
-    # 初始化数据库
-    init_db()
-    
-    # 创建系统默认提示词
-    db = SessionLocal()
-    try:
-        # 检查是否已存在系统提示词
-        polish_prompt = db.query(CustomPrompt).filter(
-            CustomPrompt.is_system.is_(True),
-            CustomPrompt.stage == "polish"
-        ).first()
-        
-        if not polish_prompt:
-            polish_prompt = CustomPrompt(
-                name="默认润色提示词",
-                stage="polish",
-                content=get_default_polish_prompt(),
-                is_default=True,
-                is_system=True
-            )
-            db.add(polish_prompt)
-        
-        enhance_prompt = db.query(CustomPrompt).filter(
-            CustomPrompt.is_system.is_(True),
-            CustomPrompt.stage == "enhance"
-        ).first()
-        
-        if not enhance_prompt:
-            enhance_prompt = CustomPrompt(
-                name="默认增强提示词",
-                stage="enhance",
-                content=get_default_enhance_prompt(),
-                is_default=True,
-                is_system=True
-            )
-            db.add(enhance_prompt)
-        
-        db.commit()
-    finally:
-        db.close()
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """关闭时清理资源"""
-    job_manager = get_job_manager()
-    await job_manager.shutdown()
-
-
 @app.get("/health")
 async def health_check():
     """健康检查"""
@@ -189,31 +147,27 @@ async def health_check():
     )
 
 
+# 验证 base_url 是否符合 OpenAI API 格式（使用更严格的 URL 验证模式）
+_URL_RE = re.compile(r'^https?://[^\s/$.?#].[^\s]*$', re.IGNORECASE)
+
+
+@lru_cache(maxsize=32)
 def _check_url_format(base_url: Optional[str]) -> tuple:
-    """检查 URL 格式是否正确
+    """检查 URL 格式是否正确（纯函数，按 URL 缓存结果）
     
     Returns:
         tuple: (is_valid, error_message)
     """
-    import re
-    
     if not base_url or not base_url.strip():
         return False, "Base URL 未配置"
     
-    # 验证 base_url 是否符合 OpenAI API 格式
-    # 使用更严格的 URL 验证模式
-    url_pattern = re.compile(r'^https?://[^\s/$.?#].[^\s]*$', re.IGNORECASE)
-    if not url_pattern.match(base_url):
+    if not _URL_RE.match(base_url):
         return False, "Base URL 格式不正确，应为有效的 HTTP/HTTPS URL"
     
     return True, None
 
 
-# 缓存已检查的 URL 结果，避免重复检查
-_url_check_cache: dict = {}
-
-
-async def _check_model_health(model_name: str, model: str, api_key: Optional[str], base_url: Optional[str]) -> dict:
+def _check_model_health(model_name: str, model: str, api_key: Optional[str], base_url: Optional[str]) -> dict:
     """检查单个模型的健康状态 - 只验证URL格式，不测试实际连接"""
     
     try:
@@ -237,27 +191,12 @@ async def _check_model_health(model_name: str, model: str, api_key: Optional[str
                 "error": error_msg
             }
         
-        # URL 有效时才检查缓存（此时 base_url 不为 None）
-        if base_url in _url_check_cache:
-            cached_result = _url_check_cache[base_url]
-            result = {
-                "status": cached_result["status"],
-                "model": model,
-                "base_url": base_url
-            }
-            if cached_result["status"] == "unavailable":
-                result["error"] = cached_result.get("error")
-            return result
-        
         # URL 格式正确，认为配置有效
-        result = {
+        return {
             "status": "available",
             "model": model,
             "base_url": base_url
         }
-        # 缓存检查结果
-        _url_check_cache[base_url] = {"status": "available"}
-        return result
         
     except Exception as e:
         error_msg = str(e) if str(e) else "未知错误"
@@ -269,52 +208,40 @@ async def _check_model_health(model_name: str, model: str, api_key: Optional[str
         }
 
 
-@app.get("/api/health/models")
-async def check_models_health():
-    """检查 AI 模型可用性 - 只验证URL格式，如果URL相同则只检查一次"""
-    global _url_check_cache
-    # 清空缓存以确保每次请求都重新检查
-    _url_check_cache = {}
-    
+@lru_cache(maxsize=8)
+def _models_health_body(checks: tuple) -> bytes:
+    """根据模型配置生成健康检查的 JSON 响应体（纯函数，配置不变时直接复用）"""
     results = {
         "overall_status": "healthy",
-        "models": {}
+        "models": {
+            name: _check_model_health(name, model, api_key, base_url)
+            for name, model, api_key, base_url in checks
+        }
     }
     
-    # 检查润色模型
-    results["models"]["polish"] = await _check_model_health(
-        "polish",
-        settings.POLISH_MODEL,
-        settings.POLISH_API_KEY,
-        settings.POLISH_BASE_URL
-    )
-    if results["models"]["polish"]["status"] == "unavailable":
+    if any(r["status"] == "unavailable" for r in results["models"].values()):
         results["overall_status"] = "degraded"
     
-    # 检查增强模型
-    results["models"]["enhance"] = await _check_model_health(
-        "enhance",
-        settings.ENHANCE_MODEL,
-        settings.ENHANCE_API_KEY,
-        settings.ENHANCE_BASE_URL
+    # 与 JSONResponse 的序列化方式一致
+    return json.dumps(results, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+@app.get("/api/health/models")
+async def check_models_health():
+    """检查 AI 模型可用性 - 只验证URL格式，配置未变化时直接返回缓存的结果"""
+    # 润色模型、增强模型，以及感情润色模型（如果配置了）
+    # 配置可由管理后台热更新，因此以当前配置作为缓存键，而不是在启动时固定结果
+    checks = (
+        ("polish", settings.POLISH_MODEL, settings.POLISH_API_KEY, settings.POLISH_BASE_URL),
+        ("enhance", settings.ENHANCE_MODEL, settings.ENHANCE_API_KEY, settings.ENHANCE_BASE_URL),
     )
-    if results["models"]["enhance"]["status"] == "unavailable":
-        results["overall_status"] = "degraded"
-    
-    # 检查感情润色模型（如果配置了）
     if settings.EMOTION_MODEL:
-        results["models"]["emotion"] = await _check_model_health(
-            "emotion",
-            settings.EMOTION_MODEL,
-            settings.EMOTION_API_KEY,
-            settings.EMOTION_BASE_URL
-        )
-        if results["models"]["emotion"]["status"] == "unavailable":
-            results["overall_status"] = "degraded"
+        checks += (("emotion", settings.EMOTION_MODEL, settings.EMOTION_API_KEY, settings.EMOTION_BASE_URL),)
     
     # 返回带缓存控制头的响应，确保数据始终是最新的
-    return JSONResponse(
-        content=results,
+    return Response(
+        content=_models_health_body(checks),
+        media_type="application/json",
         headers={
             "Cache-Control": "no-cache, no-store, must-revalidate",
             "Pragma": "no-cache",
@@ -330,76 +257,25 @@ if os.path.exists(STATIC_DIR):
     if os.path.exists(assets_dir):
         app.mount("/assets", StaticFiles(directory=assets_dir), name="assets")
     
-    # 处理根路径和其他前端路由
-    @app.get("/")
-    async def serve_root():
-        """服务根路径"""
-        index_file = os.path.join(STATIC_DIR, 'index.html')
-        if os.path.exists(index_file):
-            return FileResponse(index_file)
-        return {"message": "AI 论文润色增强系统 API", "version": "1.0.0", "docs": "/docs"}
+    # 前端构建产物在运行期间不会变化，index.html 只在启动时检查并 stat 一次
+    INDEX_FILE = os.path.join(STATIC_DIR, 'index.html')
+    _INDEX_STAT = os.stat(INDEX_FILE) if os.path.isfile(INDEX_FILE) else None
     
-    @app.get("/admin")
-    @app.get("/admin/{path:path}")
-    async def serve_admin(path: str = ""):
-        """服务管理后台页面"""
-        index_file = os.path.join(STATIC_DIR, 'index.html')
-        if os.path.exists(index_file):
-            return FileResponse(index_file)
-        return {"error": "Admin page not found"}
-    
-    @app.get("/workspace")
-    @app.get("/workspace/{path:path}")
-    async def serve_workspace(path: str = ""):
-        """服务工作区页面"""
-        index_file = os.path.join(STATIC_DIR, 'index.html')
-        if os.path.exists(index_file):
-            return FileResponse(index_file)
-        return {"error": "Workspace page not found"}
-
-    @app.get("/word-formatter")
-    @app.get("/word-formatter/{path:path}")
-    async def serve_word_formatter(path: str = ""):
-        """服务 Word 格式化页面"""
-        index_file = os.path.join(STATIC_DIR, 'index.html')
-        if os.path.exists(index_file):
-            return FileResponse(index_file)
-        return {"error": "Word formatter page not found"}
-
-    @app.get("/session/{session_id}")
-    async def serve_session(session_id: str):
-        """服务会话详情页面"""
-        index_file = os.path.join(STATIC_DIR, 'index.html')
-        if os.path.exists(index_file):
-            return FileResponse(index_file)
-        return {"error": "Session page not found"}
-    
-    @app.get("/access/{card_key}")
-    async def serve_access(card_key: str):
-        """服务访问页面"""
-        index_file = os.path.join(STATIC_DIR, 'index.html')
-        if os.path.exists(index_file):
-            return FileResponse(index_file)
-        return {"error": "Access page not found"}
-    
-    # 处理其他静态文件
-    @app.get("/{file_path:path}")
-    async def serve_static(file_path: str):
-        """服务其他静态文件"""
-        # 如果是 API 路径，抛出 404 让 FastAPI 正确处理
-        if file_path.startswith('api/') or file_path.startswith('docs') or file_path.startswith('openapi'):
-            raise HTTPException(status_code=404, detail="Not found")
-        
-        full_path = os.path.join(STATIC_DIR, file_path)
-        if os.path.exists(full_path) and os.path.isfile(full_path):
-            return FileResponse(full_path)
+    class SPAStaticFiles(StaticFiles):
+        """静态文件服务，找不到文件时返回前端入口 index.html"""
         
-        # 对于 SPA 路由，返回 index.html
-        index_file = os.path.join(STATIC_DIR, 'index.html')
-        if os.path.exists(index_file):
-            return FileResponse(index_file)
-        
-        raise HTTPException(status_code=404, detail="File not found")
+        async def get_response(self, path: str, scope):
+            try:
+                return await super().get_response(path, scope)
+            except StarletteHTTPException as exc:
+                # API 路径保持 404，让前端能区分接口不存在
+                if exc.status_code != 404 or _INDEX_STAT is None or path.startswith(('api/', 'docs', 'openapi')):
+                    raise
+                return FileResponse(INDEX_FILE, stat_result=_INDEX_STAT)
+    
+    # 其余路径交给 StaticFiles：存在的文件直接返回（支持 ETag/304），
+    # 前端路由（/admin、/workspace、/session/... 等）回退到 index.html
+    app.mount("/", SPAStaticFiles(directory=STATIC_DIR, html=True, check_dir=False), name="spa")
 else:
     @app.get("/")
     async def root():
@@ -412,18 +288,21 @@ else:
         }
 
 
+# 服务器开始监听端口后置位，浏览器线程据此打开页面
+_server_ready = threading.Event()
+
+
 def open_browser(port: int):
-    """延迟打开浏览器"""
-    time.sleep(2)  # 等待服务器启动
+    """服务器就绪后打开浏览器"""
+    import webbrowser
+    _server_ready.wait()  # 等待服务器开始监听
     url = f"http://localhost:{port}"
     print(f"\n🌐 正在打开浏览器: {url}")
     webbrowser.open(url)
 
 
-def create_sample_env():
-    """创建示例 .env 文件（如果不存在）"""
-    if not os.path.exists(ENV_FILE):
-        sample_content = """# AI 学术写作助手配置文件
+# 首次运行时写入的示例 .env 内容
+_SAMPLE_ENV_CONTENT = """# AI 学术写作助手配置文件
 # 请根据实际情况修改以下配置
 
 # 服务器配置
@@ -475,10 +354,38 @@ ADMIN_PASSWORD=please-change-this-password
 DEFAULT_USAGE_LIMIT=1
 SEGMENT_SKIP_THRESHOLD=15
 """
-        with open(ENV_FILE, 'w', encoding='utf-8') as f:
-            f.write(sample_content)
-        print(f"✅ 已创建示例配置文件: {ENV_FILE}")
-        print("   请编辑此文件，填入您的 API Key 和其他配置")
+
+
+def create_sample_env():
+    """创建示例 .env 文件（如果不存在）"""
+    # O_EXCL 保证"检查并创建"是原子的：文件已存在（或另一个实例抢先创建）时直接跳过
+    try:
+        # 文件中保存 API Key，仅允许当前用户读写
+        fd = os.open(ENV_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(_SAMPLE_ENV_CONTENT)
+    print(f"✅ 已创建示例配置文件: {ENV_FILE}")
+    print("   请编辑此文件，填入您的 API Key 和其他配置")
+
+
+def _select_loop() -> str:
+    """uvloop 可用时使用 uvloop（Windows 上不可用），否则使用标准 asyncio 事件循环"""
+    try:
+        import uvloop  # noqa: F401
+        return "uvloop"
+    except ImportError:
+        return "asyncio"
+
+
+def _select_http() -> str:
+    """httptools 可用时使用 C 实现的 HTTP 解析器，否则回退到 h11"""
+    try:
+        import httptools  # noqa: F401
+        return "httptools"
+    except ImportError:
+        return "h11"
 
 
 def main():
@@ -504,15 +411,33 @@ def main():
     browser_thread.daemon = True
     browser_thread.start()
     
-    # 启动 uvicorn 服务器
+    # 启动 uvicorn 服务器（可用时显式选择 uvloop / httptools，打包时也会一并收集）
+    # uvicorn 只在直接运行时需要，被其他 ASGI 服务器导入 app 时不加载
+    import uvicorn
+    
+    class _NotifyingServer(uvicorn.Server):
+        """套接字开始监听后通知浏览器线程"""
+        
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            if self.started:
+                _server_ready.set()
+    
+    config = uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        loop=_select_loop(),
+        http=_select_http(),
+        log_level="info",
+        access_log=settings.ACCESS_LOG
+    )
+    server = _NotifyingServer(config)
     try:
-        uvicorn.run(
-            app,
-            host=host,
-            port=port,
-            log_level="info",
-            access_log=True
-        )
+        server.run()
+        if not server.started:
+            # 启动失败（如 lifespan 初始化出错），与 uvicorn.run 一样以非零状态退出
+            sys.exit(3)
     except KeyboardInterrupt:
         print("\n\n👋 服务已停止")
         sys.exit(0)